@@ -99,6 +99,33 @@ elif len(sys.argv) > 0 and sys.argv[1] != 'collectstatic':
         "default": dj_database_url.parse(os.environ.get("DATABASE_URL")),
     }
 
+# Report cache, keyed on the per-course data version. Set REPORT_CACHE_DIR to share
+# the cache between gunicorn workers through the file system.
+REPORT_CACHE_TIMEOUT = int(os.getenv("REPORT_CACHE_TIMEOUT", 24 * 3600))
+# Cohorts above this size get report tables loaded per student on demand
+REPORT_LAZY_STUDENTS = int(os.getenv("REPORT_LAZY_STUDENTS", 40))
+# Import jobs whose worker has not reported for this many seconds are re-queued, up to IMPORT_JOB_ATTEMPTS runs
+IMPORT_JOB_TIMEOUT = int(os.getenv("IMPORT_JOB_TIMEOUT", 300))
+IMPORT_JOB_ATTEMPTS = int(os.getenv("IMPORT_JOB_ATTEMPTS", 2))
+# All-courses ZIP export: parallel course builds and the overall deadline in seconds
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", 4))
+EXPORT_DEADLINE = int(os.getenv("EXPORT_DEADLINE", 600))
+if os.getenv("REPORT_CACHE_DIR", None) is None:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'TIMEOUT': REPORT_CACHE_TIMEOUT,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv("REPORT_CACHE_DIR"),
+            'TIMEOUT': REPORT_CACHE_TIMEOUT,
+        }
+    }
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class CtkirepConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ctkirep'
+
+    def ready(self):
+        from ctkirep import signals
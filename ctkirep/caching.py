@@ -0,0 +1,40 @@
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from ctkirep.models import CourseType, CourseDataVersion
+
+
+# Report cache
+# ========================================================================
+# Cached report data is keyed on the course data version, so bumping the version
+# (imports, student and course edits) makes every older entry unreachable
+def data_version(course):
+    version = CourseDataVersion.objects.filter(course_id=course).values_list('version', flat=True).first()
+    return version or 0
+
+def course_version(request, course):
+    # (version, last change) for conditional GETs, looked up once per request
+    versions = request.__dict__.setdefault('_course_versions', dict())
+    if course not in versions:
+        row = CourseDataVersion.objects.filter(course_id=course).values_list('version', 'updated').first()
+        versions[course] = row or (0, None)
+    return versions[course]
+
+def bump_data_version(courses):
+    courses = set(courses)
+    if not courses:
+        return
+    CourseDataVersion.objects.filter(course_id__in=courses).update(version=F('version') + 1, updated=timezone.now())
+    missing = CourseType.objects.filter(id__in=courses).exclude(coursedataversion__isnull=False).values_list('id', flat=True)
+    CourseDataVersion.objects.bulk_create([CourseDataVersion(course_id=course, version=1) for course in missing], ignore_conflicts=True)
+
+def cached_report(name, course, build, *key):
+    cache_key = 'ctkirep:{0}:{1}:{2}'.format(name, course, data_version(course))
+    if key:
+        cache_key += ':' + ':'.join(str(k) for k in key)
+    data = cache.get(cache_key)
+    if data is None:
+        data = build()
+        cache.set(cache_key, data)
+    return data
@@ -0,0 +1,245 @@
+import csv
+import json
+import re
+import tempfile
+import time
+import zipfile
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeout
+from datetime import date, timedelta
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import F
+
+from ctkirep.caching import data_version
+from ctkirep.models import CourseType, Student, ExportSnapshot, ReadingTime, ACELearnerJourney
+from ctkirep.reports import reading_time_stream, progress_test_stream
+from ctkirep.templatetags.ctkirep_extras import duration, diffduration
+
+# Rows are written through a pseudo-buffer and sent in blocks while the query is still being read
+CSV_BLOCK = 500
+RT_HEADER = ['Name', 'Surname', 'Code', 'Subject', 'Activity', 'Required time', 'Reading time', 'Difference', 'Last read time', 'Max timer']
+PT_HEADER = ['Name', 'Surname', 'Code', 'Subject', 'Test', 'Status', 'Timestamp', 'Score', 'Attempts']
+TIMINGS_HEADER = ['Course', 'Status', 'Seconds', 'Reading time rows', 'Progress test rows']
+# Rows per keyset page of the raw event exports
+EVENT_PAGE = 2000
+# Raw events: model, timestamp field and exported columns
+EVENT_EXPORTS = {
+    'sessions': (ReadingTime, 'start', ('id', 'student_id', 'start', 'end', 'duration', 'activity_id'),
+                 {'name': F('student__name'), 'surname': F('student__surname'), 'activity_name': F('activity__name')}),
+    'journey': (ACELearnerJourney, 'timestamp', ('id', 'student_id', 'timestamp', 'attempt', 'score', 'duration', 'statement_id', 'response'),
+                {'name': F('student__name'), 'surname': F('student__surname'), 'code': F('activity__subject__code'),
+                 'activity_name': F('activity__name'), 'status': F('action__name')}),
+}
+
+
+# CSV exports
+# ========================================================================
+class Echo:
+    def write(self, value):
+        return value
+
+def csv_blocks(header, rows):
+    writer = csv.writer(Echo())
+    block = [writer.writerow(header)]
+    for row in rows:
+        block.append(writer.writerow(row))
+        if len(block) >= CSV_BLOCK:
+            yield ''.join(block)
+            block = list()
+    if block:
+        yield ''.join(block)
+
+def safe_name(course_name):
+    # Course names end up in file and ZIP member names, where a slash would create directories
+    return re.sub(r'[^\w.-]+', '_', course_name)
+
+def reading_time_filename(course_name, start_date, end_date):
+    return 'ReadingTime_{0}_{1}_{2}.csv'.format(safe_name(course_name), start_date or 'start', end_date or date.today())
+
+def progress_test_filename(course_name, start_date=None, end_date=None):
+    if start_date or end_date:
+        return 'ProgressTests_{0}_{1}_{2}.csv'.format(safe_name(course_name), start_date or 'start', end_date or date.today())
+    return 'ProgressTests_{0}_{1}.csv'.format(safe_name(course_name), date.today())
+
+def event_filename(kind, course_name, start_date, end_date):
+    return '{0}_{1}_{2}_{3}'.format(kind.capitalize(), safe_name(course_name), start_date or 'start', end_date or date.today())
+
+def reading_time_csv_rows(courseid, start_date, end_date):
+    for student, rows in reading_time_stream(courseid, Student.objects.filter(course=courseid), start_date, end_date):
+        for cst_data in rows:
+            yield [student.name, student.surname, cst_data['subject__code'], cst_data['subject__fname'], cst_data['ractivity__name'], duration(cst_data['reqtime']), duration(cst_data['totaltime']), diffduration(cst_data['diff']), cst_data['last_time'], cst_data['alert']]
+
+def progress_test_csv_rows(courseid, start_date=None, end_date=None):
+    for name, surname, code, fname, test, status, timestamp, score, max_attempt in progress_test_stream(courseid, start_date, end_date):
+        yield [name, surname, code, fname, test, status.upper(), timestamp, score, max_attempt]
+
+
+# All courses in one ZIP archive
+# ========================================================================
+class ZipSink:
+    # Unseekable target for ZipFile, the bytes written so far are handed out after each member
+    def __init__(self):
+        self.chunks = list()
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = list()
+        return data
+
+def counted(rows, counter):
+    for row in rows:
+        counter[0] += 1
+        yield row
+
+def until(blocks, deadline):
+    for block in blocks:
+        if time.monotonic() > deadline:
+            raise TimeoutError('Deadline exceeded')
+        yield block
+
+def course_csv_files(courseid, deadline):
+    # Runs in a worker thread, on the thread's own connection which is closed when done.
+    # The course is abandoned between two blocks once the monotonic deadline has passed
+    started = time.perf_counter()
+    rt_rows, pt_rows = [0], [0]
+    try:
+        rt = ''.join(until(csv_blocks(RT_HEADER, counted(reading_time_csv_rows(courseid, None, None), rt_rows)), deadline))
+        pt = ''.join(until(csv_blocks(PT_HEADER, counted(progress_test_csv_rows(courseid), pt_rows)), deadline))
+    finally:
+        connection.close()
+    return rt, pt, [time.perf_counter() - started, rt_rows[0], pt_rows[0]]
+
+def all_courses_zip(deadline, workers):
+    # Members are streamed in completion order; courses still running at the deadline are left out
+    # and reported in timings.csv together with the time each finished course took
+    stop = time.monotonic() + deadline
+    courses = list(CourseType.objects.order_by('sorder').values_list('id', 'name'))
+    # Different names may sanitise to the same member name, the course id tells those apart
+    members = dict()
+    for courseid, name in courses:
+        member = safe_name(name)
+        while member in members.values():
+            member = '{0}_{1}'.format(member, courseid)
+        members[courseid] = member
+    sink = ZipSink()
+    archive = zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED)
+    timings = dict()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {executor.submit(course_csv_files, courseid, stop): courseid for courseid, name in courses}
+        try:
+            for future in as_completed(futures, timeout=max(stop - time.monotonic(), 0)):
+                courseid = futures[future]
+                try:
+                    rt, pt, timing = future.result()
+                except Exception as err:
+                    timings[courseid] = ['Failed: {0}'.format(err), '', '', '']
+                    continue
+                archive.writestr('ReadingTime_{0}.csv'.format(members[courseid]), rt)
+                archive.writestr('ProgressTests_{0}.csv'.format(members[courseid]), pt)
+                timings[courseid] = ['OK', '{0:.3f}'.format(timing[0]), timing[1], timing[2]]
+                yield sink.pop()
+        except FuturesTimeout:
+            pass
+
+        writer = csv.writer(Echo())
+        lines = [writer.writerow(TIMINGS_HEADER)]
+        for courseid, name in courses:
+            lines.append(writer.writerow([name] + timings.get(courseid, ['Deadline of {0}s exceeded'.format(deadline), '', '', ''])))
+        archive.writestr('timings.csv', ''.join(lines))
+        archive.close()
+        yield sink.pop()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Snapshots
+# ========================================================================
+# Pre-rendered exports are served as long as the course data version they were built from is current
+def current_snapshot(kind, courseid, start_date=None, end_date=None):
+    snapshot = ExportSnapshot.objects.filter(kind=kind, course_id=courseid, start_date=start_date, end_date=end_date).order_by('-created').first()
+    if snapshot is None or snapshot.version != data_version(courseid) or not snapshot.file.storage.exists(snapshot.file.name):
+        return None
+    return snapshot
+
+def write_snapshot(kind, courseid, start_date, end_date, filename, blocks):
+    # blocks() is only called when the stored file is missing or out of date; returns True if it was rebuilt
+    if current_snapshot(kind, courseid, start_date, end_date) is not None:
+        return False
+
+    # The version is read before the data: a change during the build leaves the snapshot stale, never wrong
+    version = data_version(courseid)
+    with tempfile.TemporaryFile() as tmp:
+        for block in blocks():
+            tmp.write(block.encode('utf-8'))
+        tmp.seek(0)
+        name = default_storage.save('snapshots/' + filename, File(tmp))
+
+    snapshot = ExportSnapshot.objects.filter(kind=kind, course_id=courseid, start_date=start_date, end_date=end_date).order_by('-created').first()
+    old_name = None
+    if snapshot is None:
+        snapshot = ExportSnapshot(kind=kind, course_id=courseid, start_date=start_date, end_date=end_date)
+    else:
+        old_name = snapshot.file.name
+    snapshot.version = version
+    snapshot.file.name = name
+    snapshot.save()
+    if old_name and old_name != name:
+        default_storage.delete(old_name)
+    return True
+
+
+# Raw events
+# ========================================================================
+def keyset_pages(rows, key):
+    # Ordered by (key, id), every page starts right after the last row of the previous one,
+    # so deep pages are as cheap as the first one
+    page = list(rows.order_by(key, 'id')[:EVENT_PAGE])
+    while page:
+        yield from page
+        if len(page) < EVENT_PAGE:
+            break
+        last = page[-1]
+        page = list(rows.filter(**{key + '__gte': last[key]}).exclude(**{key: last[key], 'id__lte': last['id']}).order_by(key, 'id')[:EVENT_PAGE])
+
+def event_header(kind):
+    model, key, fields, related = EVENT_EXPORTS[kind]
+    return list(fields) + list(related)
+
+def event_rows(kind, courseid, student=None, start_date=None, end_date=None):
+    # Dicts of the events of a course, the end date is inclusive
+    model, key, fields, related = EVENT_EXPORTS[kind]
+    events = model.objects.filter(student_id__in=Student.objects.filter(course=courseid).values('id'))
+    if student is not None:
+        events = events.filter(student_id=student)
+    if start_date:
+        events = events.filter(**{key + '__gte': start_date})
+    if end_date:
+        events = events.filter(**{key + '__lt': end_date + timedelta(days=1)})
+    return keyset_pages(events.values(*fields, **related), key)
+
+def event_csv_rows(kind, rows):
+    header = event_header(kind)
+    for row in rows:
+        yield [row[col] for col in header]
+
+def ndjson_blocks(rows):
+    block = list()
+    for row in rows:
+        block.append(json.dumps(row, cls=DjangoJSONEncoder) + '\n')
+        if len(block) >= CSV_BLOCK:
+            yield ''.join(block)
+            block = list()
+    if block:
+        yield ''.join(block)
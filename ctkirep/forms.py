@@ -3,6 +3,12 @@ from django import forms
 
 from ctkirep.models import ReadingTimeUpload, PTUpload, Student
 
+# Reports may be uploaded as they are, gzipped or as a zip archive holding the one file
+def check_report_name(upload, suffix):
+    if not upload.name.lower().endswith((suffix, suffix + '.gz', '.zip')):
+        raise forms.ValidationError('Expected a {0} file, optionally compressed as {0}.gz or .zip'.format(suffix))
+    return upload
+
 class UploadFileForm(forms.ModelForm):
     upload_status = forms.CharField(label="Upload status:", disabled=True, required=False, widget=forms.TextInput(attrs={'style': 'border-style:none; width: 100%'}))
     class Meta:
@@ -10,17 +16,37 @@ class UploadFileForm(forms.ModelForm):
         fields = ['timestamp', 'file']
         widgets = {
             'timestamp': forms.TextInput(attrs={'readonly': True}),
-            'file' : forms.FileInput(attrs={'accept': '.xml'})
+            'file' : forms.FileInput(attrs={'accept': '.xml,.gz,.zip'})
         }
 
+    def clean_file(self):
+        return check_report_name(self.cleaned_data['file'], '.xml')
+
+# Date range the export form starts with, also the range export snapshots are built for
+EXPORT_START = date(2022, 3, 22)
+
 class RTExportForm(forms.Form):
     def __init__(self, course_types, *args, **kwargs):
         super(RTExportForm, self).__init__(*args, **kwargs)
         self.fields['course'].choices = course_types
 
     course = forms.ChoiceField(label="Course type", choices=())
-    start_date = forms.DateField(label='Start date', input_formats=['%d.%m.%Y', '%d/%m/%Y', '%Y-%m-%d'], initial=date(2022, 3, 22), widget=forms.DateInput(attrs={'type': 'date'}))
-    end_date = forms.DateField(label='End date', input_formats=['%d.%m.%Y', '%d/%m/%Y', '%Y-%m-%d'], initial=date.today(), widget=forms.DateInput(attrs={'type': 'date'}))
+    start_date = forms.DateField(label='Start date', input_formats=['%d.%m.%Y', '%d/%m/%Y', '%Y-%m-%d'], initial=EXPORT_START, required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    end_date = forms.DateField(label='End date', input_formats=['%d.%m.%Y', '%d/%m/%Y', '%Y-%m-%d'], initial=date.today, required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+
+class DateRangeForm(forms.Form):
+    start_date = forms.DateField(label='From', input_formats=['%d.%m.%Y', '%d/%m/%Y', '%Y-%m-%d'], required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    end_date = forms.DateField(label='Until', input_formats=['%d.%m.%Y', '%d/%m/%Y', '%Y-%m-%d'], required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+
+    def range(self):
+        # (start, end) of a valid form, (None, None) otherwise
+        if not self.is_valid():
+            return (None, None)
+        return (self.cleaned_data['start_date'], self.cleaned_data['end_date'])
+
+class EventExportForm(DateRangeForm):
+    student = forms.IntegerField(label='Student', required=False, min_value=1)
+    format = forms.ChoiceField(label='Format', choices=(('csv', 'CSV'), ('ndjson', 'NDJSON')), required=False)
 
 class PTFileForm(forms.ModelForm):
     upload_status = forms.CharField(label="Upload status:", disabled=True, required=False, widget=forms.TextInput(attrs={'style': 'border-style:none; width: 100%'}))
@@ -29,9 +55,12 @@ class PTFileForm(forms.ModelForm):
         fields = ['timestamp', 'file']
         widgets = {
             'timestamp': forms.TextInput(attrs={'readonly': True}),
-            'file' : forms.FileInput(attrs={'accept': '.csv'})
+            'file' : forms.FileInput(attrs={'accept': '.csv,.gz,.zip'})
         }
 
+    def clean_file(self):
+        return check_report_name(self.cleaned_data['file'], '.csv')
+
 class StudentForm(forms.ModelForm):
     class Meta:
         model = Student
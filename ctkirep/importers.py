@@ -0,0 +1,679 @@
+import io
+import os
+import xml.etree.ElementTree as ET
+import csv
+import gzip
+import time
+import zipfile
+import zlib
+
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from operator import itemgetter
+from django.db import connection, transaction
+from django.db.models import Max
+
+from ctkirep.caching import bump_data_version
+from ctkirep.summaries import update_reading_summary, update_ace_stats
+from ctkirep.parsing import parse_imrs_datetime, parse_ace_timestamp, parse_iso_duration
+from ctkirep.models import ReadingActivity, ReadingTime, Student, ACEContentStatus, ACEActivity, ACEStatus, ACEActivityType, ACELearnerJourney
+
+# Rows per INSERT statement for the bulk loaders
+BATCH_SIZE = 2000
+# pg_advisory_xact_lock key serialising the reading time imports, which hand out their own ids
+READING_TIME_LOCK = 0x63746b01
+
+
+class ImportAbort(Exception):
+    pass
+
+
+def _no_progress(phase, rows):
+    pass
+
+
+# Compressed reports
+# ==============================================================================================================
+COMPRESSION_ERRORS = (gzip.BadGzipFile, zipfile.BadZipFile, zlib.error, EOFError)
+
+
+def open_report(path, text=True):
+    # Plain, gzip or single-member zip file; archives are decompressed while they are read
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+
+    if magic[:2] == b'\x1f\x8b':
+        stream = gzip.open(path, 'rb')
+    elif magic == b'PK\x03\x04':
+        with zipfile.ZipFile(path) as zf:
+            members = [info for info in zf.infolist() if not info.is_dir()]
+            if len(members) != 1:
+                raise ImportAbort('Zip file must contain exactly one report: ' + path)
+            # The member keeps the archive file open after the ZipFile is closed
+            stream = zf.open(members[0])
+    elif text:
+        return open(path, newline='')
+    else:
+        return open(path, 'rb')
+
+    if text:
+        return io.TextIOWrapper(stream, newline='')
+    return stream
+
+
+# PostgreSQL fast path: rows are streamed with COPY into a temporary staging table
+# and merged into the target table with one INSERT ... SELECT
+# ==============================================================================================================
+def copy_supported():
+    return connection.vendor == 'postgresql'
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, timedelta):
+        return '{0} seconds'.format(value.total_seconds())
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+def _quoted(columns, prefix=''):
+    return ', '.join(prefix + connection.ops.quote_name(col) for col in columns)
+
+def stage_create(cursor, stage, model, columns):
+    # Dropped with the commit, but an import nested in an outer transaction may find the previous one
+    cursor.execute('DROP TABLE IF EXISTS {0}'.format(stage))
+    cursor.execute('CREATE TEMPORARY TABLE {0} ON COMMIT DROP AS SELECT {1} FROM {2} WITH NO DATA'.format(
+        stage, _quoted(columns), model._meta.db_table))
+
+def stage_copy(cursor, stage, columns, objs):
+    buf = io.StringIO()
+    for obj in objs:
+        buf.write('\t'.join(_copy_value(getattr(obj, col)) for col in columns))
+        buf.write('\n')
+    buf.seek(0)
+    cursor.copy_expert('COPY {0} ({1}) FROM STDIN'.format(stage, _quoted(columns)), buf)
+
+def stage_analyze(cursor, stage):
+    # Temporary tables are never analyzed by autovacuum, the merges are planned for the rows actually staged
+    cursor.execute('ANALYZE {0}'.format(stage))
+
+def _match(key, left, right):
+    return ' AND '.join('{0}.{2} = {1}.{2}'.format(left, right, connection.ops.quote_name(col)) for col in key)
+
+def stage_merge(cursor, stage, model, columns, key, order, select=None, where='TRUE'):
+    # Duplicates are dropped both inside the file and against rows already loaded
+    cursor.execute('INSERT INTO {table} ({cols}) SELECT {select} FROM ('
+                   'SELECT DISTINCT ON ({key}) * FROM {stage} WHERE {where} ORDER BY {key}, {order}) s '
+                   'WHERE NOT EXISTS (SELECT 1 FROM {table} t WHERE {match})'.format(
+                       table=model._meta.db_table, cols=_quoted(columns), select=select or _quoted(columns, 's.'),
+                       key=_quoted(key), stage=stage, where=where, order=_quoted(order), match=_match(key, 't', 's')))
+    return cursor.rowcount
+
+def stage_merge_ignore(cursor, stage, model, columns, conflict, where='TRUE'):
+    cursor.execute('INSERT INTO {table} ({cols}) SELECT {cols} FROM {stage} WHERE {where} ON CONFLICT ({conflict}) DO NOTHING'.format(
+        table=model._meta.db_table, cols=_quoted(columns), stage=stage, where=where, conflict=_quoted(conflict)))
+    return cursor.rowcount
+
+def stage_upsert(cursor, stage, model, columns, conflict, order):
+    # The last staged row of each key wins; stored rows that already hold its values are left alone.
+    # Returns (created, updated)
+    values = [col for col in columns if col not in conflict]
+    cursor.execute('WITH u AS (INSERT INTO {table} AS t ({cols}) SELECT {cols} FROM ('
+                   'SELECT DISTINCT ON ({conflict}) * FROM {stage} ORDER BY {conflict}, {order} DESC) s '
+                   'ON CONFLICT ({conflict}) DO UPDATE SET {update} WHERE ({old}) IS DISTINCT FROM ({new}) '
+                   'RETURNING xmax = 0 AS created) '
+                   'SELECT count(*) FILTER (WHERE created), count(*) FILTER (WHERE NOT created) FROM u'.format(
+                       table=model._meta.db_table, cols=_quoted(columns), conflict=_quoted(conflict), stage=stage, order=_quoted(order),
+                       update=', '.join('{0} = EXCLUDED.{0}'.format(connection.ops.quote_name(col)) for col in values),
+                       old=_quoted(values, 't.'), new=_quoted(values, 'EXCLUDED.')))
+    return cursor.fetchone()
+
+def stage_adopt(cursor, stage, model, key, column):
+    # Rows loaded before `column` existed get it from the staged rows they match on `key`,
+    # paired one to one in order when several rows share a key. Only the keys of the file are
+    # numbered, read through the partial index on `key` of the rows still missing `column`
+    cursor.execute('UPDATE {table} t SET {col} = p.{col} FROM ('
+                   'SELECT l.id, s.{col} FROM ('
+                   'SELECT j.id, {jkey}, row_number() OVER (PARTITION BY {jkey} ORDER BY j.id) AS n FROM (SELECT DISTINCT {key} FROM {stage}) k '
+                   'JOIN {table} j ON {kmatch} WHERE j.{col} IS NULL) l '
+                   'JOIN (SELECT {key}, {col}, row_number() OVER (PARTITION BY {key} ORDER BY {col}) AS n FROM ('
+                   'SELECT DISTINCT ON ({col}) {key}, {col} FROM {stage} s WHERE {col} IS NOT NULL '
+                   'AND NOT EXISTS (SELECT 1 FROM {table} k WHERE k.{col} = s.{col}) ORDER BY {col}) d) s ON {match} AND l.n = s.n) p '
+                   'WHERE t.id = p.id'.format(
+                       table=model._meta.db_table, col=connection.ops.quote_name(column), key=_quoted(key), jkey=_quoted(key, 'j.'), stage=stage,
+                       kmatch=_match(key, 'j', 'k'), match=_match(key, 'l', 's')))
+    return cursor.rowcount
+
+
+# Importer framework
+# ==============================================================================================================
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.rows = 0
+        self.seconds = 0.0
+
+    def __str__(self):
+        return '{0} {1:.2f}s/{2} rows'.format(self.name, self.seconds, self.rows)
+
+
+class ReportImporter:
+    # Pipeline: header -> references -> prepare -> read -> decode -> resolve -> validate -> write (per batch) -> finish.
+    # Subclasses override the hooks below; decode() returning None or validate() returning
+    # False skips a row. Time and rows per stage end up in self.stats and the result message.
+    STAGES = ('header', 'references', 'prepare', 'read', 'decode', 'resolve', 'validate', 'write', 'finish')
+    parse_errors = ()
+    batch_size = BATCH_SIZE
+
+    def __init__(self, path, progress=_no_progress):
+        self.path = path
+        self.progress = progress
+        self.stats = {name: StageStats(name) for name in self.STAGES}
+        self.use_copy = copy_supported()
+        self.elapsed = 0.0
+        # Students whose rows were written, their courses get a new data version
+        self.touched_students = set()
+
+    @property
+    def lines(self):
+        return self.stats['read'].rows
+
+    def open(self):
+        return open_report(self.path)
+
+    def detect_header(self, f):
+        pass
+
+    def load_references(self):
+        pass
+
+    def records(self, f):
+        raise NotImplementedError
+
+    def decode(self, record):
+        return record
+
+    def resolve(self, row):
+        return row
+
+    def validate(self, row):
+        return True
+
+    def prepare(self, cursor):
+        pass
+
+    def write(self, cursor, batch):
+        raise NotImplementedError
+
+    def finish(self, cursor):
+        pass
+
+    def result(self):
+        raise NotImplementedError
+
+    def parse_error(self, err):
+        return str(err)
+
+    def run(self):
+        if not self.path:
+            return 'Empty file path'
+
+        try:
+            f = self.open()
+        except ImportAbort as abort:
+            return str(abort)
+        except COMPRESSION_ERRORS:
+            return 'Invalid compressed file: ' + self.path
+        except OSError as osErr:
+            return osErr.strerror
+
+        started = time.perf_counter()
+        try:
+            with f:
+                self._timed('header', self.detect_header, f)
+                self.progress('loading references', 0)
+                self._timed('references', self.load_references)
+                with transaction.atomic(), connection.cursor() as cursor:
+                    self._timed('prepare', self.prepare, cursor)
+                    self._pipeline(cursor, f)
+                    self._timed('finish', self.finish, cursor)
+                    bump_data_version(Student.objects.filter(id__in=self.touched_students).values_list('course_id', flat=True).distinct())
+        except ImportAbort as abort:
+            return str(abort)
+        except self.parse_errors as err:
+            return self.parse_error(err)
+        except COMPRESSION_ERRORS:
+            return 'Invalid compressed file: ' + self.path
+        self.elapsed = time.perf_counter() - started
+
+        os.remove(self.path)
+        return '{0} [{1}]'.format(self.result(), ', '.join(str(st) for st in self.stats.values()))
+
+    def _timed(self, stage, func, *args):
+        stats = self.stats[stage]
+        t0 = time.perf_counter()
+        res = func(*args)
+        stats.seconds += time.perf_counter() - t0
+        stats.rows += 1
+        return res
+
+    def _pipeline(self, cursor, f):
+        read, decode, resolve, validate, write = (self.stats[name] for name in ('read', 'decode', 'resolve', 'validate', 'write'))
+        clock = time.perf_counter
+        batch = list()
+        records = iter(self.records(f))
+        while True:
+            t0 = clock()
+            record = next(records, None)
+            t1 = clock()
+            read.seconds += t1 - t0
+            if record is None:
+                break
+            read.rows += 1
+
+            row = self.decode(record)
+            t2 = clock()
+            decode.seconds += t2 - t1
+            if row is None:
+                continue
+            decode.rows += 1
+
+            row = self.resolve(row)
+            t3 = clock()
+            resolve.seconds += t3 - t2
+            resolve.rows += 1
+
+            valid = self.validate(row)
+            validate.seconds += clock() - t3
+            if not valid:
+                continue
+            validate.rows += 1
+
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self._write(write, cursor, batch)
+                batch = list()
+                self.progress('importing', read.rows)
+
+        if batch:
+            self._write(write, cursor, batch)
+
+    def _write(self, stats, cursor, batch):
+        t0 = time.perf_counter()
+        self.write(cursor, batch)
+        stats.seconds += time.perf_counter() - t0
+        stats.rows += len(batch)
+
+
+class CSVReportImporter(ReportImporter):
+    # ACE CSV report, decoded by position: `columns` are handed to decode() as a tuple, in order
+    schema = []
+    columns = ()
+    report_name = ''
+    # Bad cells raise ValueError (dates, ints) or InvalidOperation (Decimal)
+    parse_errors = (csv.Error, ValueError, InvalidOperation)
+
+    def detect_header(self, f):
+        self.reader = csv.reader(f)
+        header = next(self.reader, None)
+        if header:
+            # Reports saved from Excel start with a UTF-8 BOM
+            header[0] = header[0].lstrip('\ufeff')
+        if header != self.schema:
+            raise ImportAbort('File is not {0} report'.format(self.report_name))
+        self.fields = itemgetter(*(header.index(col) for col in self.columns))
+
+    def records(self, f):
+        fields = self.fields
+        for row in self.reader:
+            if row:
+                yield fields(row)
+
+    def parse_error(self, err):
+        return 'file {}, line {}: {}'.format(self.path, self.reader.line_num, err)
+
+
+# Reading time (iMRS XML)
+# ==============================================================================================================
+class ReadingTimeImporter(ReportImporter):
+    parse_errors = (ET.ParseError, ValueError)
+    columns = ('id', 'student_id', 'activity_id', 'start', 'end', 'duration')
+    key = ('student_id', 'activity_id', 'start', 'end')
+
+    def open(self):
+        return open_report(self.path, text=False)
+
+    def parse_error(self, err):
+        if isinstance(err, ET.ParseError):
+            return 'Invalid XML file: {}, line {}'.format(self.path, err.position[0])
+        return 'file {}, result {}: {}'.format(self.path, self.lines, err)
+
+    def load_references(self):
+        self.new_counter = 0
+        self.touched_activities = set()
+
+        self.students = dict()
+        # Last session end per student, from the summary rather than every session
+        for student in Student.objects.all().annotate(last_read=Max('readingtimesummary__last_time')):
+            self.students[student.reading_username] = student
+
+        self.ractivities = dict()
+        for ractivity in ReadingActivity.objects.all():
+            self.ractivities[ractivity.name] = ractivity
+
+    def records(self, f):
+        trk = None
+        has_tracking = False
+        # Incremental parse, every consumed <result> is dropped from the tree right away
+        for event, elem in ET.iterparse(f, events=('start', 'end')):
+            if event == 'start':
+                if elem.tag == 'tracking' and trk is None:
+                    trk = elem
+                    has_tracking = True
+                continue
+
+            if elem.tag == 'tracking':
+                trk = None
+                continue
+
+            if elem.tag != 'result' or trk is None:
+                continue
+
+            stime = elem.findtext('starttime')
+            if stime is None:
+                stime = ""
+            etime = elem.findtext('endtime')
+            if etime is None:
+                etime = stime
+            record = (elem.findtext('identifier'), elem.findtext('activity'), stime, etime)
+            trk.clear()
+            yield record
+
+        if not has_tracking:
+            raise ImportAbort('Invalid XML file: ' + self.path)
+
+    def decode(self, record):
+        ident, xactivity, stime, etime = record
+        return (ident, xactivity, parse_imrs_datetime(stime), parse_imrs_datetime(etime))
+
+    def resolve(self, row):
+        ident, xactivity, dt1, dt2 = row
+        st = self.students.get(ident)
+        if(st is None):
+            raise ImportAbort('Username [' + str(ident) + '] not valid')
+
+        ra = self.ractivities.get(xactivity)
+        if(ra is None):
+            raise ImportAbort('Reading activity [' + str(xactivity) + '] not valid')
+        return (st, ra, dt1, dt2)
+
+    def validate(self, row):
+        st, ra, dt1, dt2 = row
+        return not (st.last_read and (dt2 <= st.last_read))
+
+    def prepare(self, cursor):
+        # Ids continue from the current maximum, read inside the import transaction while no other
+        # reading time import can run; other backends serialise their writers anyway
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT pg_advisory_xact_lock(%s)', [READING_TIME_LOCK])
+        new_id = ReadingTime.objects.aggregate(lr=Max('id'))['lr']
+        if new_id is None:
+            new_id = 0
+        self.first_id = self.new_id = new_id + 1
+        if self.use_copy:
+            stage_create(cursor, 'rt_stage', ReadingTime, self.columns)
+
+    def write(self, cursor, batch):
+        objs = list()
+        for st, ra, dt1, dt2 in batch:
+            objs.append(ReadingTime(student=st, activity=ra, start=dt1, end=dt2, duration=(dt2-dt1), id=self.new_id))
+            self.new_id += 1
+            self.touched_students.add(st.id)
+            self.touched_activities.add(ra.id)
+
+        if self.use_copy:
+            stage_copy(cursor, 'rt_stage', self.columns, objs)
+        else:
+            ReadingTime.objects.bulk_create(objs, BATCH_SIZE)
+            self.new_counter += len(objs)
+
+    def finish(self, cursor):
+        if self.use_copy:
+            stage_analyze(cursor, 'rt_stage')
+            # Ids stay contiguous after dedupe, numbered from the first one handed out
+            self.new_counter = stage_merge(cursor, 'rt_stage', ReadingTime, self.columns, self.key, ('id',),
+                                           select='{0} + row_number() OVER (ORDER BY s.id), {1}'.format(
+                                               self.first_id - 1, _quoted(self.columns[1:], 's.')))
+
+        self.progress('updating summary', self.lines)
+        update_reading_summary(self.touched_students, self.touched_activities)
+
+    def result(self):
+        return 'OK, {0} new rows inserted, total rows in file {1}'.format(self.new_counter, self.lines)
+
+
+# ACE content status (CSV)
+# ==============================================================================================================
+class ContentStatusImporter(CSVReportImporter):
+    report_name = 'ContentStatus'
+    schema = ['Username', 'First name', 'Surname', 'Groups', 'Timestamp', 'Date', 'Time', 'Activity ID',
+              'Activity external reference', 'Activity name', 'Display type', 'Status', 'Score', 'CPD points', 'Learning hours']
+    columns = ('Username', 'Timestamp', 'Display type', 'Activity name', 'Status', 'Score')
+    copy_columns = ('student_id', 'activity_id', 'timestamp', 'status_id', 'score')
+    key = ('student_id', 'activity_id')
+
+    def load_references(self):
+        self.crt_counter = self.upd_counter = self.staged = 0
+        # Reference keys, one query per table
+        self.students = dict(Student.objects.values_list('pt_username', 'id'))
+        self.atypes = set(ACEActivityType.objects.values_list('name', flat=True))
+        self.activities = dict(ACEActivity.objects.values_list('name', 'id'))
+        self.statuses = dict(ACEStatus.objects.values_list('name', 'id'))
+
+    def decode(self, record):
+        username, tstamp, atype, aname, status, score = record
+        # Timestamp
+        ts = None
+        if tstamp != '-':
+            ts = parse_ace_timestamp(tstamp.strip())
+
+        scr = None
+        if score.strip() != '-':
+            scr = Decimal(score)
+        return (username, ts, atype, aname, status, scr)
+
+    def resolve(self, row):
+        username, ts, atype, aname, status, scr = row
+        st = self.students.get(username.strip())
+        if st is None:
+            raise ImportAbort('Username [' + username + '] not valid')
+
+        # Activity
+        if atype.strip() not in self.atypes:
+            raise ImportAbort('Unknown activity type: ' + atype)
+
+        act = self.activities.get(aname.strip())
+        if act is None:
+            raise ImportAbort('Unknown activity: ' + aname)
+
+        stat = self.statuses.get(status.strip())
+        if stat is None:
+            raise ImportAbort('Unknown activity: ' + status)
+        return (st, act, ts, stat, scr)
+
+    def prepare(self, cursor):
+        if self.use_copy:
+            # Staged with the line number as id, so the last line of a (student, activity) pair wins
+            stage_create(cursor, 'cs_stage', ACEContentStatus, ('id',) + self.copy_columns)
+
+    def write(self, cursor, batch):
+        if self.use_copy:
+            objs = list()
+            for st, act, ts, stat, scr in batch:
+                self.staged += 1
+                objs.append(ACEContentStatus(id=self.staged, student_id=st, activity_id=act, timestamp=ts, status_id=stat, score=scr))
+                self.touched_students.add(st)
+            stage_copy(cursor, 'cs_stage', ('id',) + self.copy_columns, objs)
+            return
+
+        # Later rows for the same (student, activity) win, as with update_or_create
+        latest = dict()
+        for st, act, ts, stat, scr in batch:
+            latest[(st, act)] = (ts, stat, scr)
+            self.touched_students.add(st)
+
+        existing = dict()
+        rows = ACEContentStatus.objects.filter(student_id__in={k[0] for k in latest}, activity_id__in={k[1] for k in latest})
+        for cs in rows:
+            existing[(cs.student_id, cs.activity_id)] = cs
+
+        new_rows = list()
+        upd_rows = list()
+        for (st, act), (ts, stat, scr) in latest.items():
+            cs = existing.get((st, act))
+            if cs is None:
+                new_rows.append(ACEContentStatus(student_id=st, activity_id=act, timestamp=ts, status_id=stat, score=scr))
+            elif cs.timestamp != ts or cs.status_id != stat or cs.score != scr:
+                cs.timestamp = ts
+                cs.status_id = stat
+                cs.score = scr
+                upd_rows.append(cs)
+
+        if new_rows:
+            ACEContentStatus.objects.bulk_create(new_rows, BATCH_SIZE)
+        if upd_rows:
+            ACEContentStatus.objects.bulk_update(upd_rows, ['timestamp', 'status', 'score'], BATCH_SIZE)
+        self.crt_counter += len(new_rows)
+        self.upd_counter += len(upd_rows)
+
+    def finish(self, cursor):
+        if self.use_copy:
+            # One upsert on the (student, activity) constraint, safe against an overlapping import
+            stage_analyze(cursor, 'cs_stage')
+            self.crt_counter, self.upd_counter = stage_upsert(cursor, 'cs_stage', ACEContentStatus, self.copy_columns, self.key, ('id',))
+
+    def result(self):
+        return 'OK, {0} records created, {1} records updated, {2} total records in file'.format(self.crt_counter, self.upd_counter, self.lines)
+
+
+# ACE learner journey (CSV)
+# ==============================================================================================================
+class JourneyImporter(CSVReportImporter):
+    report_name = 'LearnerJourney'
+    schema = ['Username', 'First name', 'Surname', 'Groups', 'Timestamp', 'Date', 'Time', 'Attempt', 'Duration',
+              'Statement ID', 'Course ID', 'Course', 'Activity ID', 'Activity name', 'Type', 'Action', 'Response', 'Mark', 'Score']
+    columns = ('Username', 'Timestamp', 'Attempt', 'Duration', 'Statement ID', 'Course', 'Type', 'Action', 'Response', 'Score')
+    copy_columns = ('student_id', 'timestamp', 'attempt', 'duration', 'activity_id', 'action_id', 'response', 'score', 'statement_id')
+    # Identifies an event without a Statement ID: rows loaded before the column existed and reports leaving it empty
+    event_key = ('student_id', 'activity_id', 'timestamp', 'attempt', 'action_id')
+
+    def load_references(self):
+        self.created = self.matched = 0
+        self.touched_activities = set()
+        self.students = dict(Student.objects.values_list('pt_username', 'id'))
+        self.atypes = set(ACEActivityType.objects.values_list('name', flat=True))
+        self.activities = dict(ACEActivity.objects.values_list('name', 'id'))
+        self.statuses = dict(ACEStatus.objects.values_list('name', 'id'))
+
+    def decode(self, record):
+        username, tstamp, attempt, duration, stmt, course, atype, action, resp, score = record
+        if len(action) == 0:
+            return None
+
+        # Timestamp
+        ts = parse_ace_timestamp(tstamp.strip())
+
+        # Duration
+        dr = None
+        if len(duration):
+            dr = parse_iso_duration(duration.strip())
+
+        # Score
+        scr = None
+        if score.strip() != '-':
+            scr = score
+
+        return (username.strip(), ts, int(attempt.strip()), dr, atype.strip(), course.strip(),
+                action.strip(), resp, scr, stmt.strip() or None)
+
+    def resolve(self, row):
+        username, ts, atmpt, dr, atype, course, action, resp, scr, stmt = row
+        st = self.students.get(username)
+        if st is None:
+            raise ImportAbort('Username [' + username + '] not valid')
+
+        if atype not in self.atypes:
+            raise ImportAbort('Unknown activity type: ' + atype)
+
+        act = self.activities.get(course)
+        if act is None:
+            raise ImportAbort('Unknown activity: ' + course)
+
+        stat = self.statuses.get(action)
+        if stat is None:
+            raise ImportAbort('Unknown activity status: ' + action)
+
+        return ACELearnerJourney(student_id=st, timestamp=ts, attempt=atmpt, duration=dr, activity_id=act,
+                                 action_id=stat, response=resp, score=scr, statement_id=stmt)
+
+    def prepare(self, cursor):
+        if self.use_copy:
+            stage_create(cursor, 'journey_stage', ACELearnerJourney, self.copy_columns)
+
+    def write(self, cursor, batch):
+        for obj in batch:
+            self.touched_students.add(obj.student_id)
+            self.touched_activities.add(obj.activity_id)
+
+        if self.use_copy:
+            stage_copy(cursor, 'journey_stage', self.copy_columns, batch)
+            return
+
+        # Statements already loaded (by an earlier batch or an overlapping report) are skipped,
+        # events without a Statement ID are matched on the event key
+        ids = {obj.statement_id for obj in batch if obj.statement_id}
+        known = set(ACELearnerJourney.objects.filter(statement_id__in=ids).values_list('statement_id', flat=True))
+        loaded = set()
+        unnamed = dict()
+        for row in ACELearnerJourney.objects.filter(student_id__in={obj.student_id for obj in batch}, timestamp__gte=min(obj.timestamp for obj in batch),
+                                                    timestamp__lte=max(obj.timestamp for obj in batch)).order_by('id').values_list('id', 'statement_id', *self.event_key):
+            loaded.add(row[2:])
+            if row[1] is None:
+                unnamed.setdefault(row[2:], list()).append(row[0])
+
+        new_rows = list()
+        named = list()
+        for obj in batch:
+            key = tuple(getattr(obj, col) for col in self.event_key)
+            if obj.statement_id:
+                if obj.statement_id in known:
+                    continue
+                known.add(obj.statement_id)
+                if unnamed.get(key):
+                    named.append(ACELearnerJourney(id=unnamed[key].pop(0), statement_id=obj.statement_id))
+                    continue
+            elif key in loaded:
+                continue
+            loaded.add(key)
+            new_rows.append(obj)
+
+        ACELearnerJourney.objects.bulk_update(named, ['statement_id'], BATCH_SIZE)
+        ACELearnerJourney.objects.bulk_create(new_rows, BATCH_SIZE, ignore_conflicts=True)
+        self.created += len(new_rows)
+        self.matched += len(named)
+
+    def finish(self, cursor):
+        if self.use_copy:
+            stage_analyze(cursor, 'journey_stage')
+            self.matched = stage_adopt(cursor, 'journey_stage', ACELearnerJourney, self.event_key, 'statement_id')
+            self.created = stage_merge_ignore(cursor, 'journey_stage', ACELearnerJourney, self.copy_columns, ('statement_id',),
+                                              where='statement_id IS NOT NULL')
+            self.created += stage_merge(cursor, 'journey_stage', ACELearnerJourney, self.copy_columns, self.event_key, ('timestamp',),
+                                        where='statement_id IS NULL')
+
+        self.progress('updating statistics', self.lines)
+        update_ace_stats(self.touched_students, self.touched_activities)
+
+    def result(self):
+        return 'OK, {0} records created, {1} existing records given their Statement ID, {2} total records in file, {3:.0f} rows/s'.format(
+            self.created, self.matched, self.lines, self.lines / self.elapsed if self.elapsed > 0 else 0)
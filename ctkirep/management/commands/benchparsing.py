@@ -0,0 +1,50 @@
+import random
+import time
+import timeit
+
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand
+
+from ctkirep import parsing
+
+
+def _strptime_duration(value):
+    times = time.strptime(value.replace('PT', ''), '%HH%MM%SS')
+    return timedelta(hours=times.tm_hour, minutes=times.tm_min, seconds=times.tm_sec)
+
+
+class Command(BaseCommand):
+    help = 'Compares the report value parsers with the strptime calls they replace'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='Values parsed per run')
+        parser.add_argument('--distinct', type=int, default=5000, help='Distinct values among them')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per parser, the best one is reported')
+
+    def handle(self, *args, **options):
+        rnd = random.Random(0)
+        base = datetime(2022, 3, 22)
+        moments = [base + timedelta(seconds=rnd.randrange(180 * 86400)) for i in range(options['distinct'])]
+        imrs = [rnd.choice(moments).strftime('%d/%m/%Y %H:%M:%S') for i in range(options['rows'])]
+        ace = [rnd.choice(moments).strftime('%Y-%m-%dT%H:%M:%S.000Z') for i in range(options['rows'])]
+        durations = ['PT{0}H{1}M{2}S'.format(rnd.randrange(3), rnd.randrange(60), rnd.randrange(60)) for i in range(options['rows'])]
+
+        cases = [
+            ('iMRS datetime', imrs, lambda v: datetime.strptime(v, '%d/%m/%Y %H:%M:%S'), parsing.parse_imrs_datetime),
+            ('ACE timestamp', ace, lambda v: datetime.strptime(v, '%Y-%m-%dT%H:%M:%S.%fZ'), parsing.parse_ace_timestamp),
+            ('ISO duration', durations, _strptime_duration, parsing.parse_iso_duration),
+        ]
+        self.stdout.write('{0} values, {1} distinct'.format(options['rows'], options['distinct']))
+        for name, values, old, new in cases:
+            for value in values[:1000]:
+                if old(value) != new(value):
+                    self.stderr.write('{0}: results differ for {1}'.format(name, value))
+                    break
+
+            t_old = self.best(old, values, options['repeat'])
+            t_new = self.best(new, values, options['repeat'], new.cache_clear)
+            self.stdout.write('{0:15} strptime {1:7.3f}s  parsing {2:7.3f}s  x{3:.1f}'.format(name, t_old, t_new, t_old / t_new))
+
+    def best(self, func, values, repeat, setup='pass'):
+        # Every run starts with a cold memo cache
+        return min(timeit.repeat(lambda: [func(v) for v in values], setup=setup, number=1, repeat=repeat))
@@ -0,0 +1,29 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from ctkirep.models import CourseType, Student
+from ctkirep.reports import reading_time_data, progress_test_data
+
+
+class Command(BaseCommand):
+    help = 'Times the report data builds of every course on the current database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append', help='Course ID, all courses by default')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per report, the best one is reported')
+
+    def handle(self, *args, **options):
+        courses = CourseType.objects.order_by('sorder')
+        if options['course']:
+            courses = courses.filter(id__in=options['course'])
+        for course in courses:
+            students = list(Student.objects.filter(course=course, active=True))
+            for name, build in (('reading time', reading_time_data), ('progress tests', progress_test_data)):
+                with CaptureQueriesContext(connection) as ctx:
+                    build(course.id, students)
+                best = min(timeit.repeat(lambda: build(course.id, students), number=1, repeat=options['repeat']))
+                self.stdout.write('{0:10} {1:15} {2:5} students {3:3} queries {4:7.3f}s'.format(
+                    course.name, name, len(students), len(ctx.captured_queries), best))
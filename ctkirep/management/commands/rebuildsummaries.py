@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from ctkirep.summaries import rebuild_reading_summary, rebuild_ace_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the report summary tables from the imported rows'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rt_rows = rebuild_reading_summary()
+            ace_rows = rebuild_ace_stats()
+        self.stdout.write('Reading time summary: {0} rows'.format(rt_rows))
+        self.stdout.write('Progress test statistics: {0} rows'.format(ace_rows))
@@ -0,0 +1,114 @@
+import threading
+import time
+import traceback
+
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction, DatabaseError
+from django.db.models import Q
+from django.utils import timezone
+
+from ctkirep.models import ImportJob
+from ctkirep.utils import bulk_reading_time, ace_contentstatus, ace_journeyreport
+
+IMPORTERS = {
+    ImportJob.READING_TIME: bulk_reading_time,
+    ImportJob.CONTENT_STATUS: ace_contentstatus,
+    ImportJob.JOURNEY: ace_journeyreport,
+}
+
+
+class JobProgress:
+    def __init__(self):
+        self.phase = ''
+        self.rows = 0
+        self.result = None
+
+    def __call__(self, phase, rows):
+        self.phase = phase
+        self.rows = rows
+
+
+class Command(BaseCommand):
+    help = 'Runs queued report imports'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is empty')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds between queue polls')
+
+    def handle(self, *args, **options):
+        while True:
+            job = self.claim_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['sleep'])
+                continue
+
+            self.stdout.write('Import job #{0} ({1}): {2}'.format(job.id, job.get_kind_display(), job.path))
+            self.run_job(job)
+            self.stdout.write('Import job #{0} {1}: {2}'.format(job.id, job.status, job.message))
+
+    def release_stalled(self):
+        # The import transaction of a dead worker was rolled back with its connection, so the job can run again
+        now = timezone.now()
+        limit = now - timedelta(seconds=settings.IMPORT_JOB_TIMEOUT)
+        stalled = ImportJob.objects.select_for_update(skip_locked=True).filter(
+            Q(heartbeat__lt=limit) | Q(heartbeat__isnull=True, started__lt=limit), status=ImportJob.RUNNING)
+        for job in stalled:
+            if job.attempts < settings.IMPORT_JOB_ATTEMPTS:
+                job.status = ImportJob.QUEUED
+                job.message = 'Worker stopped during {0}, re-queued'.format(job.phase)
+            else:
+                job.status = ImportJob.FAILED
+                job.message = 'Worker stopped during {0}, {1} attempts made'.format(job.phase, job.attempts)
+                job.finished = now
+            job.phase = ''
+            job.save(update_fields=['status', 'message', 'phase', 'finished'])
+            self.stdout.write('Import job #{0} stalled: {1}'.format(job.id, job.message))
+
+    def claim_job(self):
+        with transaction.atomic():
+            self.release_stalled()
+            job = ImportJob.objects.select_for_update(skip_locked=True).filter(status=ImportJob.QUEUED).order_by('created').first()
+            if job is None:
+                return None
+            job.status = ImportJob.RUNNING
+            job.phase = 'starting'
+            job.started = job.heartbeat = timezone.now()
+            job.attempts += 1
+            job.save(update_fields=['status', 'phase', 'started', 'heartbeat', 'attempts'])
+        return job
+
+    def run_job(self, job):
+        # The importer runs in its own thread (and DB connection) so that progress
+        # can be committed from here while the import transaction is still open
+        progress = JobProgress()
+        worker = threading.Thread(target=self.import_file, args=(job, progress))
+        worker.start()
+        while worker.is_alive():
+            worker.join(1.0)
+            # Saved every second as the heartbeat, stalled jobs are released by the next claim
+            job.phase = progress.phase
+            job.rows = progress.rows
+            job.heartbeat = timezone.now()
+            try:
+                job.save(update_fields=['phase', 'rows', 'heartbeat'])
+            except DatabaseError:
+                pass
+
+        job.rows = progress.rows
+        job.message = progress.result
+        job.status = ImportJob.DONE if progress.result.startswith('OK') else ImportJob.FAILED
+        job.phase = ''
+        job.finished = timezone.now()
+        job.save(update_fields=['phase', 'rows', 'message', 'status', 'finished'])
+
+    def import_file(self, job, progress):
+        try:
+            progress.result = IMPORTERS[job.kind](job.path, progress)
+        except Exception:
+            progress.result = traceback.format_exc()
+        finally:
+            connection.close()
@@ -0,0 +1,79 @@
+import fcntl
+import os
+from contextlib import contextmanager
+from datetime import date
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.files.storage import default_storage
+from django.db import connection
+
+from ctkirep.exports import RT_HEADER, PT_HEADER, csv_blocks, reading_time_filename, progress_test_filename, reading_time_csv_rows, progress_test_csv_rows, write_snapshot
+from ctkirep.forms import EXPORT_START
+from ctkirep.models import CourseType, Student, ExportSnapshot
+
+# pg_advisory_lock key of the snapshot run
+SNAPSHOT_LOCK = 0x63746b72
+
+
+@contextmanager
+def snapshot_lock():
+    # Yields False when another run holds the lock: an advisory lock on PostgreSQL, a file lock elsewhere
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_try_advisory_lock(%s)', [SNAPSHOT_LOCK])
+            locked = cursor.fetchone()[0]
+            try:
+                yield locked
+            finally:
+                if locked:
+                    cursor.execute('SELECT pg_advisory_unlock(%s)', [SNAPSHOT_LOCK])
+        return
+    os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
+    with open(os.path.join(settings.MEDIA_ROOT, 'snapshots.lock'), 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        yield True
+
+
+class Command(BaseCommand):
+    help = 'Pre-renders the default exports of every course into MEDIA_ROOT/snapshots, meant to run from cron'
+
+    def handle(self, *args, **options):
+        # Two overlapping runs would both rebuild the same snapshots and delete each other's files
+        with snapshot_lock() as locked:
+            if not locked:
+                self.stdout.write('Another snapshot run is in progress')
+                return
+            self.snapshot_all()
+
+    def snapshot_all(self):
+        today = date.today()
+        for courseid, name in CourseType.objects.order_by('sorder').values_list('id', 'name'):
+            if not Student.objects.filter(course=courseid).exists():
+                continue
+
+            # The export form defaults and the full history of both exports
+            exports = [
+                (ExportSnapshot.READING_TIME, EXPORT_START, today, reading_time_filename(name, EXPORT_START, today),
+                 lambda: csv_blocks(RT_HEADER, reading_time_csv_rows(courseid, EXPORT_START, today))),
+                (ExportSnapshot.READING_TIME, None, None, reading_time_filename(name, None, None),
+                 lambda: csv_blocks(RT_HEADER, reading_time_csv_rows(courseid, None, None))),
+                (ExportSnapshot.PROGRESS_TESTS, EXPORT_START, today, progress_test_filename(name, EXPORT_START, today),
+                 lambda: csv_blocks(PT_HEADER, progress_test_csv_rows(courseid, EXPORT_START, today))),
+                (ExportSnapshot.PROGRESS_TESTS, None, None, progress_test_filename(name),
+                 lambda: csv_blocks(PT_HEADER, progress_test_csv_rows(courseid))),
+            ]
+            kept = list()
+            for kind, start_date, end_date, filename, blocks in exports:
+                built = write_snapshot(kind, courseid, start_date, end_date, filename, blocks)
+                kept.append((kind, start_date, end_date))
+                self.stdout.write('{0} {1}: {2}'.format(name, filename, 'built' if built else 'current'))
+
+            # Snapshots of earlier default ranges are not requested anymore
+            for snapshot in ExportSnapshot.objects.filter(course_id=courseid):
+                if (snapshot.kind, snapshot.start_date, snapshot.end_date) not in kept:
+                    default_storage.delete(snapshot.file.name)
+                    snapshot.delete()
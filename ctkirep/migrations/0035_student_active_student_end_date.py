@@ -0,0 +1,23 @@
+# Generated by Django 4.0.4 on 2026-10-18 17:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctkirep', '0034_alter_acelearnerjourney_response'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='student',
+            name='active',
+            field=models.BooleanField(default=True, verbose_name='Active'),
+        ),
+        migrations.AddField(
+            model_name='student',
+            name='end_date',
+            field=models.DateField(null=True, verbose_name='Course end date'),
+        ),
+    ]
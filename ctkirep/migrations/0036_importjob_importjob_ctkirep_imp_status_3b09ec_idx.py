@@ -0,0 +1,32 @@
+# Generated by Django 4.0.4 on 2026-10-18 17:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctkirep', '0035_student_active_student_end_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.SmallIntegerField(choices=[(1, 'Reading time'), (2, 'Content status'), (3, 'Student journey')], verbose_name='Report type')),
+                ('path', models.CharField(max_length=255, verbose_name='File path')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10, verbose_name='Status')),
+                ('phase', models.CharField(blank=True, default='', max_length=30, verbose_name='Phase')),
+                ('rows', models.IntegerField(default=0, verbose_name='Rows processed')),
+                ('message', models.TextField(blank=True, default='', verbose_name='Result')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Created')),
+                ('started', models.DateTimeField(null=True, verbose_name='Started')),
+                ('finished', models.DateTimeField(null=True, verbose_name='Finished')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='importjob',
+            index=models.Index(fields=['status', 'created'], name='ctkirep_imp_status_3b09ec_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.4 on 2026-10-18 17:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctkirep', '0036_importjob_importjob_ctkirep_imp_status_3b09ec_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='acelearnerjourney',
+            name='statement_id',
+            field=models.CharField(max_length=64, null=True, unique=True, verbose_name='Statement ID'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.0.4 on 2026-10-18 17:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctkirep', '0037_acelearnerjourney_statement_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64, verbose_name='SHA-256'),
+        ),
+        migrations.AddField(
+            model_name='ptupload',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64, verbose_name='SHA-256'),
+        ),
+        migrations.AddField(
+            model_name='readingtimeupload',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64, verbose_name='SHA-256'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.0.4 on 2026-10-18 18:02
+
+import datetime
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_summary(apps, schema_editor):
+    ReadingTime = apps.get_model('ctkirep', 'ReadingTime')
+    ReadingTimeSummary = apps.get_model('ctkirep', 'ReadingTimeSummary')
+    totals = ReadingTime.objects.values('student_id', 'activity_id').annotate(
+        totaltime=models.Sum('duration'), last_time=models.Max('end'), sessions=models.Count('id'),
+        capped=models.Count('id', filter=models.Q(duration=datetime.timedelta(minutes=90)))).order_by()
+    ReadingTimeSummary.objects.bulk_create([ReadingTimeSummary(**row) for row in totals.iterator()], 2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctkirep', '0038_importjob_sha256_ptupload_sha256_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReadingTimeSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('totaltime', models.DurationField(verbose_name='Total reading time')),
+                ('last_time', models.DateTimeField(verbose_name='Last end time')),
+                ('sessions', models.IntegerField(verbose_name='Sessions')),
+                ('capped', models.IntegerField(verbose_name='Sessions stopped by the max timer')),
+                ('activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ctkirep.readingactivity', verbose_name='Activity ID')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ctkirep.student', verbose_name='Student user ID')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='readingtimesummary',
+            constraint=models.UniqueConstraint(fields=('student', 'activity'), name='rtsummary_student_activity'),
+        ),
+        migrations.RunPython(fill_summary, migrations.RunPython.noop),
+    ]
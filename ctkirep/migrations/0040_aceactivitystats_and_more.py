@@ -0,0 +1,47 @@
+# Generated by Django 4.0.4 on 2026-10-18 18:05
+
+import decimal
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_stats(apps, schema_editor):
+    ACELearnerJourney = apps.get_model('ctkirep', 'ACELearnerJourney')
+    ACEActivityStats = apps.get_model('ctkirep', 'ACEActivityStats')
+    last_score = ACELearnerJourney.objects.filter(student_id=models.OuterRef('student_id'), activity_id=models.OuterRef('activity_id'),
+                                                  score__isnull=False).order_by('-timestamp', '-id').values('score')[:1]
+    totals = ACELearnerJourney.objects.values('student_id', 'activity_id').annotate(
+        max_attempt=models.Max('attempt'), attempts=models.Count('attempt', distinct=True), best_score=models.Max('score'),
+        last_score=models.Subquery(last_score), first_pass=models.Min('timestamp', filter=models.Q(score__gte=decimal.Decimal(80))),
+        totaltime=models.Sum('duration')).order_by()
+    ACEActivityStats.objects.bulk_create([ACEActivityStats(**row) for row in totals.iterator()], 2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctkirep', '0039_readingtimesummary_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ACEActivityStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('max_attempt', models.SmallIntegerField(verbose_name='Max attempt')),
+                ('attempts', models.IntegerField(verbose_name='Attempts')),
+                ('best_score', models.DecimalField(decimal_places=2, max_digits=5, null=True, verbose_name='Best score')),
+                ('last_score', models.DecimalField(decimal_places=2, max_digits=5, null=True, verbose_name='Last score')),
+                ('first_pass', models.DateTimeField(null=True, verbose_name='First pass')),
+                ('totaltime', models.DurationField(null=True, verbose_name='Total duration')),
+                ('activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ctkirep.aceactivity', verbose_name='Activity')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ctkirep.student', verbose_name='Student')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='aceactivitystats',
+            constraint=models.UniqueConstraint(fields=('student', 'activity'), name='acestats_student_activity'),
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
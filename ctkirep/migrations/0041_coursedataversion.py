@@ -0,0 +1,22 @@
+# Generated by Django 4.0.4 on 2026-10-18 18:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctkirep', '0040_aceactivitystats_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseDataVersion',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='ctkirep.coursetype', verbose_name='Course ID')),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='Data version')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Last change')),
+            ],
+        ),
+    ]
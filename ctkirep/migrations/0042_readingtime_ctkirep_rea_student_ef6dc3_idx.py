@@ -0,0 +1,17 @@
+# Generated by Django 4.0.4 on 2026-10-18 18:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctkirep', '0041_coursedataversion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='readingtime',
+            index=models.Index(fields=['student', 'activity', 'start', 'end', 'duration'], name='ctkirep_rea_student_ef6dc3_idx'),
+        ),
+    ]
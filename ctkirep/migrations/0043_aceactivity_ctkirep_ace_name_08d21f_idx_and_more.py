@@ -0,0 +1,33 @@
+# Generated by Django 4.0.4 on 2026-10-18 18:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctkirep', '0042_readingtime_ctkirep_rea_student_ef6dc3_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aceactivity',
+            index=models.Index(fields=['name'], name='ctkirep_ace_name_08d21f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='acecontentstatus',
+            index=models.Index(fields=['student', 'activity'], name='ctkirep_ace_student_d2044c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='acelearnerjourney',
+            index=models.Index(fields=['student', 'activity', 'attempt'], name='ctkirep_ace_student_c5c712_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='acelearnerjourney',
+            index=models.Index(fields=['student', 'timestamp'], name='ctkirep_ace_student_31cfcd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='readingtime',
+            index=models.Index(fields=['student', 'activity', 'end'], name='ctkirep_rea_student_d9611f_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.0.4 on 2026-10-18 18:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctkirep', '0043_aceactivity_ctkirep_ace_name_08d21f_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.SmallIntegerField(choices=[(1, 'Reading time'), (2, 'Progress tests')], verbose_name='Export')),
+                ('start_date', models.DateField(null=True, verbose_name='Start date')),
+                ('end_date', models.DateField(null=True, verbose_name='End date')),
+                ('version', models.PositiveIntegerField(verbose_name='Data version')),
+                ('file', models.FileField(upload_to='snapshots/')),
+                ('created', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='ctkirep.coursetype', verbose_name='Course ID')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='exportsnapshot',
+            index=models.Index(fields=['course', 'kind', 'start_date', 'end_date'], name='ctkirep_exp_course__e82a7c_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.0.4 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctkirep', '0044_exportsnapshot_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='acelearnerjourney',
+            index=models.Index(fields=['timestamp', 'id'], name='ctkirep_ace_timesta_ae018c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='readingtime',
+            index=models.Index(fields=['start', 'id'], name='ctkirep_rea_start_ebb475_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='readingtime',
+            index=models.Index(fields=['student', 'start', 'id'], name='ctkirep_rea_student_d63a3a_idx'),
+        ),
+    ]
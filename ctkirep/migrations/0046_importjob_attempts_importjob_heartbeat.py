@@ -0,0 +1,23 @@
+# Generated by Django 4.0.4 on 2026-10-18 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctkirep', '0045_acelearnerjourney_ctkirep_ace_timesta_ae018c_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='attempts',
+            field=models.SmallIntegerField(default=0, verbose_name='Attempts'),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='heartbeat',
+            field=models.DateTimeField(null=True, verbose_name='Last sign of the worker'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.0.4 on 2026-10-18 18:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def link_jobs(apps, schema_editor):
+    ImportJob = apps.get_model('ctkirep', 'ImportJob')
+    uploads = {1: apps.get_model('ctkirep', 'ReadingTimeUpload'), 2: apps.get_model('ctkirep', 'PTUpload'), 3: apps.get_model('ctkirep', 'PTUpload')}
+    for job in ImportJob.objects.exclude(sha256=''):
+        for upload in uploads[job.kind].objects.filter(sha256=job.sha256, job__isnull=True):
+            if job.path.endswith(upload.file.name):
+                upload.job = job
+                upload.save(update_fields=['job'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctkirep', '0046_importjob_attempts_importjob_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ptupload',
+            name='job',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='ctkirep.importjob', verbose_name='Import job'),
+        ),
+        migrations.AddField(
+            model_name='readingtimeupload',
+            name='job',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='ctkirep.importjob', verbose_name='Import job'),
+        ),
+        migrations.RunPython(link_jobs, migrations.RunPython.noop),
+    ]
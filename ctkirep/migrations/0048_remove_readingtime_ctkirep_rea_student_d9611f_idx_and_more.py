@@ -0,0 +1,23 @@
+# Generated by Django 4.0.4 on 2026-10-18 18:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctkirep', '0047_ptupload_job_readingtimeupload_job'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='readingtime',
+            name='ctkirep_rea_student_d9611f_idx',
+        ),
+        migrations.AlterField(
+            model_name='readingtime',
+            name='student',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='ctkirep.student', verbose_name='Student user ID'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.0.4 on 2026-10-18 18:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctkirep', '0048_remove_readingtime_ctkirep_rea_student_d9611f_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='acelearnerjourney',
+            index=models.Index(condition=models.Q(('statement_id__isnull', True)), fields=['student', 'activity', 'timestamp', 'attempt', 'action'], name='journey_legacy_event'),
+        ),
+    ]
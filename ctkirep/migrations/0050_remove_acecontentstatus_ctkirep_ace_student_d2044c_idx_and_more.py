@@ -0,0 +1,30 @@
+# Generated by Django 4.0.4 on 2026-10-18 18:57
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def drop_duplicates(apps, schema_editor):
+    # Overlapping imports could store a (student, activity) pair twice, the last row written is kept
+    ACEContentStatus = apps.get_model('ctkirep', 'ACEContentStatus')
+    kept = ACEContentStatus.objects.values('student', 'activity').annotate(last=Max('id')).values('last')
+    ACEContentStatus.objects.exclude(id__in=kept).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ctkirep', '0049_acelearnerjourney_journey_legacy_event'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='acecontentstatus',
+            constraint=models.UniqueConstraint(fields=('student', 'activity'), name='contentstatus_student_activity'),
+        ),
+        migrations.RemoveIndex(
+            model_name='acecontentstatus',
+            name='ctkirep_ace_student_d2044c_idx',
+        ),
+    ]
@@ -1,6 +1,35 @@
+import hashlib
+
 from urllib import response
+from django.conf import settings
 from django.db import models
-from datetime import date
+from django.utils import timezone
+from datetime import date, timedelta
+
+#==============================================================================================================
+class ReportUpload(models.Model):
+    timestamp = models.DateTimeField()
+    file = models.FileField()
+    sha256 = models.CharField("SHA-256", max_length=64, blank=True, default='', db_index=True)
+    job = models.ForeignKey('ImportJob', on_delete=models.SET_NULL, null=True, related_name='+', verbose_name="Import job")
+
+    class Meta:
+        abstract = True
+
+    def fingerprint(self):
+        # Hashed chunk by chunk, uploads are never read into memory as a whole
+        if not self.sha256:
+            digest = hashlib.sha256()
+            for chunk in self.file.chunks():
+                digest.update(chunk)
+            self.file.seek(0)
+            self.sha256 = digest.hexdigest()
+        return self.sha256
+
+    def save(self, *args, **kwargs):
+        self.fingerprint()
+        self.file.name = self.timestamp.strftime('%Y%m%d%H%M%S_') + self.file.name
+        super().save(*args, **kwargs)
 
 #==============================================================================================================
 class CourseType(models.Model):
@@ -19,6 +48,11 @@ class Course(models.Model):
     ractivity = models.ForeignKey('ReadingActivity', on_delete=models.PROTECT, verbose_name="Reading activity ID")
     reqtime = models.DurationField(verbose_name="Required reading time", null=True)
 
+class CourseDataVersion(models.Model):
+    course = models.OneToOneField(CourseType, on_delete=models.CASCADE, primary_key=True, verbose_name="Course ID")
+    version = models.PositiveIntegerField(verbose_name="Data version", default=0)
+    updated = models.DateTimeField(verbose_name="Last change", auto_now=True)
+
 #==============================================================================================================
 class Student(models.Model):
     name = models.CharField("Name", max_length=30)
@@ -38,19 +72,37 @@ class ReadingActivity(models.Model):
 
 class ReadingTime(models.Model):
     id = models.BigIntegerField(primary_key=True)
-    student = models.ForeignKey(Student, on_delete=models.CASCADE, verbose_name="Student user ID")
+    # Indexed as the leading column of the composites below
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, db_index=False, verbose_name="Student user ID")
     activity = models.ForeignKey(ReadingActivity, on_delete=models.CASCADE, verbose_name="Activity ID")
     start = models.DateTimeField(verbose_name="Start time")
     end = models.DateTimeField(verbose_name="End time")
     duration = models.DurationField(verbose_name="Reading duration")
 
-class ReadingTimeUpload(models.Model):
-    timestamp = models.DateTimeField()
-    file = models.FileField()
+    class Meta:
+        indexes = [
+            # Covers date-range report aggregates and summary refreshes: filter on start/end, sum and count duration
+            models.Index(fields=['student', 'activity', 'start', 'end', 'duration']),
+            # Keyset pages of the raw session export, per course and per student
+            models.Index(fields=['start', 'id']),
+            models.Index(fields=['student', 'start', 'id']),
+        ]
 
-    def save(self, *args, **kwargs):
-        self.file.name = self.timestamp.strftime('%Y%m%d%H%M%S_') + self.file.name
-        super().save(*args, **kwargs)
+class ReadingTimeSummary(models.Model):
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, verbose_name="Student user ID")
+    activity = models.ForeignKey(ReadingActivity, on_delete=models.CASCADE, verbose_name="Activity ID")
+    totaltime = models.DurationField(verbose_name="Total reading time")
+    last_time = models.DateTimeField(verbose_name="Last end time")
+    sessions = models.IntegerField(verbose_name="Sessions")
+    capped = models.IntegerField(verbose_name="Sessions stopped by the max timer")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'activity'], name='rtsummary_student_activity'),
+        ]
+
+class ReadingTimeUpload(ReportUpload):
+    pass
 
 #==============================================================================================================
 class ACEActivityType(models.Model):
@@ -63,7 +115,12 @@ class ACEActivity(models.Model):
     atype = models.ForeignKey(ACEActivityType, on_delete=models.CASCADE, verbose_name="Display type")
     subject = models.ForeignKey(CourseSubject, on_delete=models.CASCADE, verbose_name="Subject ID")
     ord = models.SmallIntegerField()
-    
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['name']),
+        ]
+
 class ACEStatus(models.Model):
     id = models.SmallAutoField(primary_key=True)
     name = models.CharField(max_length=20)
@@ -76,6 +133,11 @@ class ACEContentStatus(models.Model):
     status = models.ForeignKey(ACEStatus, on_delete=models.CASCADE, verbose_name="Status")
     score = models.DecimalField(max_digits=5, decimal_places=2, verbose_name='Score', null=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'activity'], name='contentstatus_student_activity'),
+        ]
+
 class ACELearnerJourney(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE, verbose_name="Student")
     timestamp = models.DateTimeField(verbose_name="Timestamp")
@@ -85,11 +147,98 @@ class ACELearnerJourney(models.Model):
     action = models.ForeignKey(ACEStatus, on_delete=models.CASCADE, verbose_name="Action")
     response = models.TextField()
     score = models.DecimalField(max_digits=5, decimal_places=2, verbose_name='Score', null=True)
+    statement_id = models.CharField(max_length=64, unique=True, null=True, verbose_name="Statement ID")
 
-class PTUpload(models.Model):
-    timestamp = models.DateTimeField()
-    file = models.FileField()
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'activity', 'attempt']),
+            models.Index(fields=['student', 'timestamp']),
+            models.Index(fields=['timestamp', 'id']),
+            # Event key of the rows loaded before the Statement ID column, matched on re-upload
+            models.Index(fields=['student', 'activity', 'timestamp', 'attempt', 'action'], condition=models.Q(statement_id__isnull=True),
+                         name='journey_legacy_event'),
+        ]
 
-    def save(self, *args, **kwargs):
-        self.file.name = self.timestamp.strftime('%Y%m%d%H%M%S_') + self.file.name
-        super().save(*args, **kwargs)
\ No newline at end of file
+class ACEActivityStats(models.Model):
+    student = models.ForeignKey(Student, on_delete=models.CASCADE, verbose_name="Student")
+    activity = models.ForeignKey(ACEActivity, on_delete=models.CASCADE, verbose_name="Activity")
+    max_attempt = models.SmallIntegerField(verbose_name='Max attempt')
+    attempts = models.IntegerField(verbose_name='Attempts')
+    best_score = models.DecimalField(max_digits=5, decimal_places=2, verbose_name='Best score', null=True)
+    last_score = models.DecimalField(max_digits=5, decimal_places=2, verbose_name='Last score', null=True)
+    first_pass = models.DateTimeField(verbose_name="First pass", null=True)
+    totaltime = models.DurationField(verbose_name="Total duration", null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['student', 'activity'], name='acestats_student_activity'),
+        ]
+
+class PTUpload(ReportUpload):
+    pass
+#==============================================================================================================
+class ImportJob(models.Model):
+    READING_TIME = 1
+    CONTENT_STATUS = 2
+    JOURNEY = 3
+    KINDS = [
+        (READING_TIME, 'Reading time'),
+        (CONTENT_STATUS, 'Content status'),
+        (JOURNEY, 'Student journey'),
+    ]
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    kind = models.SmallIntegerField(choices=KINDS, verbose_name="Report type")
+    path = models.CharField(max_length=255, verbose_name="File path")
+    sha256 = models.CharField("SHA-256", max_length=64, blank=True, default='', db_index=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED, verbose_name="Status")
+    phase = models.CharField(max_length=30, blank=True, default='', verbose_name="Phase")
+    rows = models.IntegerField(default=0, verbose_name="Rows processed")
+    message = models.TextField(blank=True, default='', verbose_name="Result")
+    created = models.DateTimeField(auto_now_add=True, verbose_name="Created")
+    started = models.DateTimeField(null=True, verbose_name="Started")
+    finished = models.DateTimeField(null=True, verbose_name="Finished")
+    heartbeat = models.DateTimeField(null=True, verbose_name="Last sign of the worker")
+    attempts = models.SmallIntegerField(default=0, verbose_name="Attempts")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created']),
+        ]
+
+    def stalled(self):
+        # Running, but the worker stopped reporting (crashed or killed)
+        seen = self.heartbeat or self.started
+        return self.status == self.RUNNING and seen is not None and seen < timezone.now() - timedelta(seconds=settings.IMPORT_JOB_TIMEOUT)
+
+#==============================================================================================================
+class ExportSnapshot(models.Model):
+    READING_TIME = 1
+    PROGRESS_TESTS = 2
+    KINDS = [
+        (READING_TIME, 'Reading time'),
+        (PROGRESS_TESTS, 'Progress tests'),
+    ]
+
+    kind = models.SmallIntegerField(choices=KINDS, verbose_name="Export")
+    course = models.ForeignKey(CourseType, on_delete=models.CASCADE, verbose_name="Course ID")
+    start_date = models.DateField(null=True, verbose_name="Start date")
+    end_date = models.DateField(null=True, verbose_name="End date")
+    version = models.PositiveIntegerField(verbose_name="Data version")
+    file = models.FileField(upload_to='snapshots/')
+    created = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['course', 'kind', 'start_date', 'end_date']),
+        ]
@@ -0,0 +1,43 @@
+import re
+
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+# Report values repeat a lot (session boundaries, whole-second timestamps, short durations),
+# so the parsers are memoized; the caches are bounded to keep long imports flat in memory
+CACHE_SIZE = 8192
+
+# iMRS: 31/12/2022 23:59:59
+_IMRS_RE = re.compile(r'(\d{1,2})/(\d{1,2})/(\d{4}) (\d{1,2}):(\d{2}):(\d{2})')
+# ACE: 2022-12-31T23:59:59.123Z
+_ACE_RE = re.compile(r'(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})(?:\.(\d{1,6}))?Z')
+# ISO-8601 duration: P1DT2H3M4.5S, PT45S, PT26H ...
+_DURATION_RE = re.compile(r'P(?:(\d+)W)?(?:(\d+)D)?(?:T(?=\d)(?:(\d+)H)?(?:(\d+)M)?(?:(\d+(?:[.,]\d+)?)S)?)?')
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_imrs_datetime(value):
+    m = _IMRS_RE.fullmatch(value)
+    if m is None:
+        raise ValueError("time data '{0}' does not match format '%d/%m/%Y %H:%M:%S'".format(value))
+    day, month, year, hour, minute, second = m.groups()
+    return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second))
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_ace_timestamp(value):
+    m = _ACE_RE.fullmatch(value)
+    if m is None:
+        raise ValueError("time data '{0}' does not match format '%Y-%m-%dT%H:%M:%S.%fZ'".format(value))
+    year, month, day, hour, minute, second, fraction = m.groups()
+    usec = int(fraction.ljust(6, '0')) if fraction else 0
+    return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second), usec)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_iso_duration(value):
+    # Years and months have no fixed length and are not accepted
+    m = _DURATION_RE.fullmatch(value)
+    if m is None or value in ('P', 'PT'):
+        raise ValueError("'{0}' is not a valid ISO-8601 duration".format(value))
+    weeks, days, hours, minutes, seconds = m.groups()
+    return timedelta(weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0), minutes=int(minutes or 0),
+                     seconds=float(seconds.replace(',', '.')) if seconds else 0)
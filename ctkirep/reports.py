@@ -0,0 +1,261 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.db import connection
+from django.db.models import Sum, Max, Avg, Count, Q, F, QuerySet
+
+from ctkirep.models import ReadingTime, ReadingTimeSummary, Course, Student, ACEContentStatus, ACEActivityStats
+
+# Rows fetched per round trip by the streamed exports
+STREAM_CHUNK = 2000
+# Sessions capped by the iMRS reading timer
+MAX_TIMER = timedelta(minutes=90)
+# Progress test pass mark
+PASS_SCORE = Decimal(80)
+
+
+# Reading time
+# ========================================================================
+def course_subjects(course):
+    return list(Course.objects.filter(type=course).values('subject_order', 'subject__id', 'subject__code', 'subject__fname', 'ractivity__name', 'reqtime', 'ractivity_id').order_by('subject_order'))
+
+def reading_time_totals(students, subjects, start_date=None, end_date=None):
+    # One grouped aggregate for the whole cohort; the full history comes straight from the summary table,
+    # a date range is aggregated from the sessions through the (student, activity, start, end, duration) index.
+    # Sessions are counted by their start and the end date is inclusive, so both bounds are on the index range
+    student_ids = students.values('id') if isinstance(students, QuerySet) else [student.id for student in students]
+    pairs = dict(student_id__in=student_ids, activity_id__in=[cs['ractivity_id'] for cs in subjects])
+    if start_date or end_date:
+        rt = ReadingTime.objects.filter(**pairs)
+        if start_date:
+            rt = rt.filter(start__gte=start_date)
+        if end_date:
+            rt = rt.filter(start__lt=end_date + timedelta(days=1))
+        return rt.values('student_id', 'activity_id').annotate(totaltime=Sum('duration'), last_time=Max('end'), alert=Count(
+            'duration', filter=Q(duration=MAX_TIMER))).order_by()
+    return ReadingTimeSummary.objects.filter(**pairs).values('student_id', 'activity_id', 'totaltime', 'last_time', alert=F('capped'))
+
+def reading_time_data(course, students, start_date=None, end_date=None):
+    # Pivoted into {student id: [subject rows]}
+    subjects = course_subjects(course)
+    totals = dict()
+    for row in reading_time_totals(students, subjects, start_date, end_date):
+        totals[(row['student_id'], row['activity_id'])] = row
+
+    data = dict()
+    for student in students:
+        data[student.id] = [subject_row(cs, totals.get((student.id, cs['ractivity_id']))) for cs in subjects]
+    return data
+
+def reading_time_stream(course, students, start_date=None, end_date=None):
+    # Yields (student, [subject rows]) with the cohort totals read through one ordered server-side cursor,
+    # merge-joined with the students ordered by id
+    subjects = course_subjects(course)
+    totals = reading_time_totals(students, subjects, start_date, end_date).order_by('student_id').iterator(STREAM_CHUNK)
+    total = next(totals, None)
+    for student in students.order_by('id').iterator(STREAM_CHUNK):
+        mine = dict()
+        while total is not None and total['student_id'] <= student.id:
+            if total['student_id'] == student.id:
+                mine[total['activity_id']] = total
+            total = next(totals, None)
+        yield student, [subject_row(cs, mine.get(cs['ractivity_id'])) for cs in subjects]
+
+def reading_time_overview(course, students, start_date=None, end_date=None):
+    # Per student total over the course activities, for the lazily loaded report
+    subjects = course_subjects(course)
+    required = sum((cs['reqtime'] for cs in subjects if cs['reqtime'] is not None), timedelta())
+    data = {student.id: {'totaltime': timedelta(), 'reqtime': required} for student in students}
+    for row in reading_time_totals(students, subjects, start_date, end_date):
+        data[row['student_id']]['totaltime'] += row['totaltime']
+    return data
+
+def subject_row(subject, total):
+    row = dict(subject)
+    if total is None:
+        row.update(totaltime=None, last_time=None, alert=None, diff=None)
+    else:
+        row.update(totaltime=total['totaltime'], last_time=total['last_time'], alert=total['alert'])
+        row['diff'] = row['totaltime'] - row['reqtime'] if row['reqtime'] is not None else None
+    return row
+
+
+# Progress tests
+# ========================================================================
+PT_COLUMNS = ('activity__subject__course__subject_order', 'activity__subject__code', 'activity__subject__fname', 'student__id',
+              'activity__name', 'status__name', 'timestamp', 'score', 'max_attempt')
+
+# Max attempts come from the maintained per-(student, activity) statistics
+PT_REPORT_SQL = """
+    SELECT cs.id, cs.student_id, cs.activity_id, cs.status_id, cs.timestamp, cs.score,
+           c.subject_order AS activity__subject__course__subject_order, sj.code AS activity__subject__code,
+           sj.fname AS activity__subject__fname, cs.student_id AS student__id, a.name AS activity__name,
+           st.name AS status__name, ma.max_attempt
+    FROM ctkirep_acecontentstatus cs
+    JOIN ctkirep_aceactivity a ON a.id = cs.activity_id
+    JOIN ctkirep_coursesubject sj ON sj.id = a.subject_id
+    JOIN ctkirep_course c ON c.subject_id = sj.id
+    JOIN ctkirep_acestatus st ON st.id = cs.status_id
+    LEFT JOIN ctkirep_aceactivitystats ma ON ma.student_id = cs.student_id AND ma.activity_id = cs.activity_id
+    WHERE c.type_id = %s AND cs.student_id IN ({students})
+    ORDER BY cs.student_id, c.subject_order, a.ord
+"""
+
+PT_EXPORT_SQL = """
+    SELECT s.name, s.surname, sj.code, sj.fname, a.name, st.name, cs.timestamp, cs.score, ma.max_attempt
+    FROM ctkirep_acecontentstatus cs
+    JOIN ctkirep_student s ON s.id = cs.student_id
+    JOIN ctkirep_aceactivity a ON a.id = cs.activity_id
+    JOIN ctkirep_coursesubject sj ON sj.id = a.subject_id
+    JOIN ctkirep_course c ON c.subject_id = sj.id
+    JOIN ctkirep_acestatus st ON st.id = cs.status_id
+    LEFT JOIN {attempts} ma ON ma.student_id = cs.student_id AND ma.activity_id = cs.activity_id
+    WHERE c.type_id = %s AND s.course_id = %s{window}
+    ORDER BY s.id, c.subject_order, a.ord
+"""
+
+# The maintained statistics cover the full history, a date window aggregates the journey slice it covers
+PT_WINDOW_ATTEMPTS_SQL = """(
+        SELECT j.student_id, j.activity_id, MAX(j.attempt) AS max_attempt
+        FROM ctkirep_acelearnerjourney j
+        JOIN ctkirep_student js ON js.id = j.student_id
+        WHERE js.course_id = %s{window}
+        GROUP BY j.student_id, j.activity_id
+    )"""
+
+def window_sql(column, start_date, end_date):
+    # Condition and parameters of a date window, the end date is inclusive
+    sql, params = '', []
+    if start_date:
+        sql += ' AND {0} >= %s'.format(column)
+        params.append(connection.ops.adapt_datetimefield_value(datetime.combine(start_date, time.min)))
+    if end_date:
+        sql += ' AND {0} < %s'.format(column)
+        params.append(connection.ops.adapt_datetimefield_value(datetime.combine(end_date + timedelta(days=1), time.min)))
+    return sql, params
+
+def progress_test_stream(course, start_date=None, end_date=None):
+    # One ordered query over the whole course, fetched in chunks through a server-side cursor
+    # Backend value converters (SQLite returns text and floats) are applied as the ORM would
+    converters = list()
+    for pos, name in ((6, 'timestamp'), (7, 'score')):
+        col = ACEContentStatus._meta.get_field(name).get_col('cs')
+        converters.extend((pos, col, func) for func in connection.ops.get_db_converters(col))
+
+    window, window_params = window_sql('cs.timestamp', start_date, end_date)
+    if window:
+        journey_window, journey_params = window_sql('j.timestamp', start_date, end_date)
+        attempts, attempts_params = PT_WINDOW_ATTEMPTS_SQL.format(window=journey_window), [course] + journey_params
+    else:
+        attempts, attempts_params = 'ctkirep_aceactivitystats', []
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(PT_EXPORT_SQL.format(attempts=attempts, window=window), attempts_params + [course, course] + window_params)
+        while True:
+            rows = cursor.fetchmany(STREAM_CHUNK)
+            if not rows:
+                break
+            for row in rows:
+                row = list(row)
+                for pos, col, func in converters:
+                    row[pos] = func(row[pos], col, connection)
+                yield row
+
+def progress_test_overview(course, students):
+    data = {student.id: {'tests': 0, 'passed': 0} for student in students}
+    for row in ACEContentStatus.objects.filter(activity__subject__course__type=course, student_id__in=list(data)).values('student_id').annotate(
+            tests=Count('id'), passed=Count('id', filter=Q(score__gte=PASS_SCORE))).order_by():
+        data[row['student_id']] = {'tests': row['tests'], 'passed': row['passed']}
+    return data
+
+def progress_test_data(course, students):
+    data = {student.id: [] for student in students}
+    if not data:
+        return data
+
+    ids = ', '.join(str(int(sid)) for sid in data)
+    for cs in ACEContentStatus.objects.raw(PT_REPORT_SQL.format(students=ids), [course]):
+        data[cs.student_id].append({col: getattr(cs, col) for col in PT_COLUMNS})
+    return data
+
+
+# Cohort analytics
+# ========================================================================
+# Per subject reading time quartiles over the active cohort (students without sessions count as zero)
+READING_QUARTILES_SQL = """
+    SELECT c.ractivity_id,
+           percentile_cont(0.25) WITHIN GROUP (ORDER BY COALESCE(sm.totaltime, interval '0')) AS p25,
+           percentile_cont(0.5) WITHIN GROUP (ORDER BY COALESCE(sm.totaltime, interval '0')) AS median,
+           percentile_cont(0.75) WITHIN GROUP (ORDER BY COALESCE(sm.totaltime, interval '0')) AS p75,
+           COUNT(*) FILTER (WHERE sm.totaltime >= c.reqtime) AS meeting,
+           COUNT(*) AS students
+    FROM ctkirep_course c
+    CROSS JOIN ctkirep_student st
+    LEFT JOIN ctkirep_readingtimesummary sm ON sm.student_id = st.id AND sm.activity_id = c.ractivity_id
+    WHERE c.type_id = %s AND st.course_id = %s AND st.active
+    GROUP BY c.ractivity_id
+"""
+
+# Backends without ordered-set aggregates (SQLite keeps durations as microseconds): the same linear interpolation
+# between the closest ranks as percentile_cont, from ROW_NUMBER and COUNT windows over the cohort
+READING_QUARTILES_WINDOW_SQL = """
+    WITH totals AS (
+        SELECT c.ractivity_id AS activity, c.reqtime, sm.totaltime, COALESCE(sm.totaltime, 0) AS total,
+               ROW_NUMBER() OVER (PARTITION BY c.ractivity_id ORDER BY COALESCE(sm.totaltime, 0)) - 1 AS rn,
+               COUNT(*) OVER (PARTITION BY c.ractivity_id) - 1 AS last
+        FROM ctkirep_course c
+        CROSS JOIN ctkirep_student st
+        LEFT JOIN ctkirep_readingtimesummary sm ON sm.student_id = st.id AND sm.activity_id = c.ractivity_id
+        WHERE c.type_id = %s AND st.course_id = %s AND st.active
+    )
+    SELECT activity, {p25} AS p25, {median} AS median, {p75} AS p75,
+           SUM(CASE WHEN totaltime >= reqtime THEN 1 ELSE 0 END) AS meeting,
+           COUNT(*) AS students
+    FROM totals
+    GROUP BY activity
+"""
+
+def window_percentile(q):
+    low = 'CAST({0} * last AS INTEGER)'.format(q)
+    frac = '({0} * last - {1})'.format(q, low)
+    return 'SUM(CASE WHEN rn = {0} THEN total * (1 - {1}) WHEN rn = {0} + 1 THEN total * {1} ELSE 0 END)'.format(low, frac)
+
+def reading_quartiles(course):
+    quartiles = dict()
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(READING_QUARTILES_SQL, [course, course])
+            rows = cursor.fetchall()
+        else:
+            cursor.execute(READING_QUARTILES_WINDOW_SQL.format(p25=window_percentile(0.25), median=window_percentile(0.5), p75=window_percentile(0.75)),
+                           [course, course])
+            rows = [(activity, *(timedelta(microseconds=q) for q in (p25, median, p75)), meeting, students)
+                    for activity, p25, median, p75, meeting, students in cursor.fetchall()]
+    for activity, p25, median, p75, meeting, students in rows:
+        quartiles[activity] = {'p25': p25, 'median': median, 'p75': p75, 'meeting': meeting, 'students': students}
+    return quartiles
+
+def cohort_analytics(course):
+    subjects = course_subjects(course)
+    cohort = Student.objects.filter(course=course, active=True).values('id')
+    reading = reading_quartiles(course)
+    tests = dict()
+    for row in ACEContentStatus.objects.filter(student_id__in=cohort, activity__subject__course__type=course).values('activity__subject_id').annotate(
+            tests=Count('id'), passed=Count('id', filter=Q(score__gte=PASS_SCORE))).order_by():
+        tests[row['activity__subject_id']] = row
+    attempts = dict(ACEActivityStats.objects.filter(student_id__in=cohort, activity__subject__course__type=course).values('activity__subject_id').annotate(
+        avg=Avg('max_attempt')).values_list('activity__subject_id', 'avg').order_by())
+
+    rows = list()
+    for cs in subjects:
+        row = dict(cs)
+        row.update(reading.get(cs['ractivity_id'], {'p25': None, 'median': None, 'p75': None, 'meeting': 0, 'students': 0}))
+        for q in ('p25', 'median', 'p75'):
+            if row[q] is not None:
+                row[q] = timedelta(seconds=round(row[q].total_seconds()))
+        row['meeting_share'] = row['meeting'] / row['students'] if row['students'] and cs['reqtime'] is not None else None
+        row['median_diff'] = row['median'] - cs['reqtime'] if row['median'] is not None and cs['reqtime'] is not None else None
+        test = tests.get(cs['subject__id'])
+        row['tests'] = test['tests'] if test else 0
+        row['pass_rate'] = test['passed'] / test['tests'] if test else None
+        row['avg_attempts'] = attempts.get(cs['subject__id'])
+        rows.append(row)
+    return rows
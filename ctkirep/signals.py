@@ -0,0 +1,54 @@
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from ctkirep.caching import bump_data_version
+from ctkirep.models import CourseType, CourseSubject, Course, Student, ReadingActivity, ACEActivity
+
+
+# Versions are bumped once the change is committed; a course type deleted together
+# with its courses is gone by then and is skipped
+def bump_on_commit(courses):
+    courses = set(courses) - {None}
+    transaction.on_commit(lambda: bump_data_version(courses))
+
+@receiver(pre_save, sender=Student)
+def student_moved(sender, instance, **kwargs):
+    # A student changing course also changes the reports of the course they leave
+    instance._old_course_id = None
+    if instance.pk is not None:
+        instance._old_course_id = Student.objects.filter(pk=instance.pk).values_list('course_id', flat=True).first()
+
+@receiver(post_save, sender=Student)
+def student_saved(sender, instance, **kwargs):
+    bump_on_commit([instance.course_id, instance._old_course_id])
+
+@receiver(post_delete, sender=Student)
+def student_deleted(sender, instance, **kwargs):
+    bump_on_commit([instance.course_id])
+
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def course_changed(sender, instance, **kwargs):
+    bump_on_commit([instance.type_id])
+
+# Names and codes of the course setup are rendered into the reports and export snapshots
+@receiver(post_save, sender=CourseType)
+@receiver(post_delete, sender=CourseType)
+def course_type_changed(sender, instance, **kwargs):
+    bump_on_commit([instance.pk])
+
+@receiver(post_save, sender=CourseSubject)
+@receiver(post_delete, sender=CourseSubject)
+def subject_changed(sender, instance, **kwargs):
+    bump_on_commit(Course.objects.filter(subject=instance.pk).values_list('type_id', flat=True))
+
+@receiver(post_save, sender=ReadingActivity)
+@receiver(post_delete, sender=ReadingActivity)
+def reading_activity_changed(sender, instance, **kwargs):
+    bump_on_commit(Course.objects.filter(ractivity=instance.pk).values_list('type_id', flat=True))
+
+@receiver(post_save, sender=ACEActivity)
+@receiver(post_delete, sender=ACEActivity)
+def ace_activity_changed(sender, instance, **kwargs):
+    bump_on_commit(Course.objects.filter(subject=instance.subject_id).values_list('type_id', flat=True))
@@ -6,11 +6,78 @@ function filterTables(id) {
     else {
       $("#" + x).show();
       $("table[id!='" + x +"']").hide();
+      loadTable($("#" + x));
     }
   }
 
+// Lazy report tables: rows are fetched from data-src once the table is selected or scrolled into view
+function loadTable(table) {
+    table = $(table);
+    if (!table.data("src") || table.data("loaded")) {
+      return;
+    }
+    table.data("loaded", true);
+    $.getJSON(table.data("src"), function (report) {
+      var body = $("<tbody>");
+      $.each(report.rows, function (i, row) {
+        var tr = $("<tr>");
+        $.each(row, function (k, cell) {
+          var td = $("<td>");
+          if (cell !== null && typeof cell === "object") {
+            td.text(cell.v === null ? "" : cell.v);
+            if (cell.c) {
+              td.addClass(cell.c);
+            }
+          }
+          else {
+            td.text(cell === null ? "" : cell);
+          }
+          tr.append(td);
+        });
+        body.append(tr);
+      });
+      table.append(body);
+    });
+  }
+
+function lazyTables() {
+    var tables = $("table[data-src]");
+    if (!("IntersectionObserver" in window)) {
+      tables.each(function () { loadTable(this); });
+      return;
+    }
+    var observer = new IntersectionObserver(function (entries) {
+      $.each(entries, function (i, entry) {
+        if (entry.isIntersecting) {
+          observer.unobserve(entry.target);
+          loadTable(entry.target);
+        }
+      });
+    }, { rootMargin: "200px" });
+    tables.each(function () { observer.observe(this); });
+  }
+
 Date.prototype.toDateInputValue = (function() {
     var local = new Date(this);
     local.setMinutes(this.getMinutes() - this.getTimezoneOffset());
     return local.toJSON().slice(0,10);
-});
\ No newline at end of file
+});
+
+function pollImportJob(url) {
+    $.getJSON(url, function (job) {
+      var text = job.message;
+      if (job.status == "queued") {
+        text = "Import job #" + job.id + " queued";
+      }
+      else if (job.stalled) {
+        text = "Import job #" + job.id + " stopped responding, waiting for a worker to re-queue it";
+      }
+      else if (job.status == "running") {
+        text = "Import job #" + job.id + " " + job.phase + ", " + job.rows + " rows processed";
+      }
+      $("#id_upload_status").val(text);
+      if (job.status == "queued" || job.status == "running") {
+        setTimeout(function () { pollImportJob(url); }, 2000);
+      }
+    });
+  }
@@ -0,0 +1,74 @@
+from django.db.models import Sum, Max, Min, Count, Q, OuterRef, Subquery
+
+from ctkirep.models import ReadingTime, ReadingTimeSummary, ACELearnerJourney, ACEActivityStats
+from ctkirep.reports import MAX_TIMER, PASS_SCORE
+
+SUMMARY_BATCH = 2000
+RT_FIELDS = ['totaltime', 'last_time', 'sessions', 'capped']
+ACE_FIELDS = ['max_attempt', 'attempts', 'best_score', 'last_score', 'first_pass', 'totaltime']
+
+
+# Summary tables, one row per (student, activity)
+# ========================================================================
+def reading_totals(rt):
+    return rt.values('student_id', 'activity_id').annotate(totaltime=Sum('duration'), last_time=Max('end'), sessions=Count('id'),
+                                                            capped=Count('id', filter=Q(duration=MAX_TIMER))).order_by()
+
+def ace_totals(journeys):
+    last_score = ACELearnerJourney.objects.filter(student_id=OuterRef('student_id'), activity_id=OuterRef('activity_id'),
+                                                  score__isnull=False).order_by('-timestamp', '-id').values('score')[:1]
+    return journeys.values('student_id', 'activity_id').annotate(max_attempt=Max('attempt'), attempts=Count('attempt', distinct=True),
+                                                                  best_score=Max('score'), last_score=Subquery(last_score),
+                                                                  first_pass=Min('timestamp', filter=Q(score__gte=PASS_SCORE)),
+                                                                  totaltime=Sum('duration')).order_by()
+
+def refresh_summary(model, fields, totals, student_ids, activity_ids):
+    # Re-aggregates only the pairs an import touched; pairs left without source rows are dropped
+    if not student_ids or not activity_ids:
+        return 0
+
+    existing = dict()
+    for summary in model.objects.filter(student_id__in=student_ids, activity_id__in=activity_ids):
+        existing[(summary.student_id, summary.activity_id)] = summary
+
+    new_rows = list()
+    upd_rows = list()
+    for row in totals:
+        summary = existing.pop((row['student_id'], row['activity_id']), None)
+        if summary is None:
+            new_rows.append(model(**row))
+        else:
+            for field in fields:
+                setattr(summary, field, row[field])
+            upd_rows.append(summary)
+
+    model.objects.bulk_create(new_rows, SUMMARY_BATCH)
+    model.objects.bulk_update(upd_rows, fields, SUMMARY_BATCH)
+    model.objects.filter(id__in=[summary.id for summary in existing.values()]).delete()
+    return len(new_rows) + len(upd_rows) + len(existing)
+
+def rebuild_summary(model, totals):
+    model.objects.all().delete()
+    created = 0
+    batch = list()
+    for row in totals.iterator():
+        batch.append(model(**row))
+        if len(batch) >= SUMMARY_BATCH:
+            created += len(model.objects.bulk_create(batch, SUMMARY_BATCH))
+            batch = list()
+    created += len(model.objects.bulk_create(batch, SUMMARY_BATCH))
+    return created
+
+def update_reading_summary(student_ids, activity_ids):
+    rt = ReadingTime.objects.filter(student_id__in=student_ids, activity_id__in=activity_ids)
+    return refresh_summary(ReadingTimeSummary, RT_FIELDS, reading_totals(rt), student_ids, activity_ids)
+
+def rebuild_reading_summary():
+    return rebuild_summary(ReadingTimeSummary, reading_totals(ReadingTime.objects.all()))
+
+def update_ace_stats(student_ids, activity_ids):
+    journeys = ACELearnerJourney.objects.filter(student_id__in=student_ids, activity_id__in=activity_ids)
+    return refresh_summary(ACEActivityStats, ACE_FIELDS, ace_totals(journeys), student_ids, activity_ids)
+
+def rebuild_ace_stats():
+    return rebuild_summary(ACEActivityStats, ace_totals(ACELearnerJourney.objects.all()))
@@ -1,3 +1,1049 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import itertools
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import zipfile
 
-# Create your tests here.
+from datetime import date, datetime, timedelta
+from unittest import mock, skipUnless
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.http import FileResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.core.management import call_command
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import parse_http_date
+
+from ctkirep.utils import bulk_reading_time, ace_contentstatus, ace_journeyreport
+from ctkirep.importers import READING_TIME_LOCK
+from ctkirep.parsing import parse_imrs_datetime, parse_ace_timestamp, parse_iso_duration
+from ctkirep.caching import bump_data_version
+from ctkirep.views import ReadingTimeDetailsView
+from ctkirep.forms import UploadFileForm, PTFileForm
+from ctkirep.exports import course_csv_files, reading_time_filename, progress_test_filename
+from ctkirep.management.commands.runimportjobs import Command as ImportJobsCommand
+from ctkirep.management.commands.snapshotexports import snapshot_lock
+from ctkirep.reports import cohort_analytics, course_subjects, reading_time_totals
+from ctkirep.summaries import update_ace_stats, rebuild_ace_stats, update_reading_summary, rebuild_reading_summary
+from ctkirep.models import CourseType, CourseSubject, Course, ReadingActivity, ReadingTime, ReadingTimeSummary, Student, ACEActivityType, ACEActivity, ACEStatus, ACEContentStatus, ACELearnerJourney, ACEActivityStats, ExportSnapshot, ImportJob
+
+
+def seed_course(name='ATPL', subjects=3, activities=4):
+    course = CourseType.objects.create(name=name)
+    atype = ACEActivityType.objects.get_or_create(name='Test')[0]
+    for i in range(subjects):
+        subject = CourseSubject.objects.create(code='{0}{1:02}'.format(name[:3], i), fname='Subject {0}'.format(i))
+        ractivity = ReadingActivity.objects.create(id=course.id * 100 + i, name='{0} book {1}'.format(name, i))
+        Course.objects.create(type=course, subject=subject, ractivity=ractivity, subject_order=i, reqtime=timedelta(hours=10))
+        for k in range(activities):
+            ACEActivity.objects.create(link='', extref='', name='{0} PT {1}.{2}'.format(name, i, k), atype=atype, subject=subject, ord=k)
+    return course
+
+def seed_students(course, count, attempts=3, start=0):
+    passed = ACEStatus.objects.get_or_create(name='passed')[0]
+    activities = list(ACEActivity.objects.filter(subject__course__type=course))
+    students = list()
+    for i in range(start, start + count):
+        student = Student.objects.create(name='Name{0}'.format(i), surname='Surname{0}'.format(i), email_addr='',
+                                         reading_username='{0}rt{1}'.format(course.name, i), pt_username='{0}pt{1}'.format(course.name, i), course=course)
+        ts = datetime(2022, 5, 1) + timedelta(days=i)
+        ACEContentStatus.objects.bulk_create([ACEContentStatus(student=student, activity=act, status=passed, timestamp=ts, score=Decimal(85)) for act in activities])
+        ACELearnerJourney.objects.bulk_create([
+            ACELearnerJourney(student=student, activity=act, action=passed, timestamp=ts + timedelta(minutes=n), attempt=n + 1, response='',
+                              statement_id='{0}-{1}-{2}'.format(student.id, act.id, n))
+            for act in activities for n in range(attempts)])
+        students.append(student)
+    update_ace_stats([student.id for student in students], [act.id for act in activities])
+    return students
+
+
+class ParsingTests(SimpleTestCase):
+    def test_matches_strptime(self):
+        for value in ('01/06/2022 10:00:00', '31/12/2022 23:59:59', '1/2/2022 3:04:05'):
+            self.assertEqual(parse_imrs_datetime(value), datetime.strptime(value, '%d/%m/%Y %H:%M:%S'))
+        for value in ('2022-06-01T10:00:00.000Z', '2022-12-31T23:59:59.123456Z', '2022-02-28T00:00:01.5Z'):
+            self.assertEqual(parse_ace_timestamp(value), datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%fZ'))
+        for value in ('PT01H02M03S', 'PT0H0M45S', 'PT23H59M59S'):
+            parsed = time.strptime(value.replace('PT', ''), '%HH%MM%SS')
+            self.assertEqual(parse_iso_duration(value), timedelta(hours=parsed.tm_hour, minutes=parsed.tm_min, seconds=parsed.tm_sec))
+
+    def test_durations(self):
+        self.assertEqual(parse_iso_duration('PT45S'), timedelta(seconds=45))
+        self.assertEqual(parse_iso_duration('PT26H'), timedelta(hours=26))
+        self.assertEqual(parse_iso_duration('P1DT2H3M4S'), timedelta(days=1, hours=2, minutes=3, seconds=4))
+        self.assertEqual(parse_iso_duration('P2W'), timedelta(weeks=2))
+        self.assertEqual(parse_iso_duration('PT1M4.5S'), timedelta(minutes=1, seconds=4.5))
+        self.assertEqual(parse_iso_duration('PT0,25S'), timedelta(seconds=0.25))
+        self.assertEqual(parse_ace_timestamp('2022-06-01T10:00:00Z'), datetime(2022, 6, 1, 10))
+
+    def test_invalid_values(self):
+        for value in ('P', 'PT', 'PT1H2', 'P1Y', 'P1M', '45S', ''):
+            with self.assertRaisesRegex(ValueError, 'not a valid ISO-8601 duration'):
+                parse_iso_duration(value)
+        for value in ('2022-06-01 10:00:00', '01/06/22 10:00:00', '01/06/2022 10:00'):
+            with self.assertRaisesRegex(ValueError, 'does not match format'):
+                parse_imrs_datetime(value)
+        for value in ('2022-06-01T10:00:00.000', '2022-6-1T10:00:00.000Z', '2022-06-01T10:00:00.1234567Z'):
+            with self.assertRaisesRegex(ValueError, 'does not match format'):
+                parse_ace_timestamp(value)
+        # Out of range fields fail like strptime does
+        with self.assertRaises(ValueError):
+            parse_imrs_datetime('31/02/2022 10:00:00')
+        with self.assertRaises(ValueError):
+            parse_ace_timestamp('2022-13-01T10:00:00.000Z')
+
+
+class ReadingTimeReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('trainer')
+        cls.course = seed_course(subjects=1)
+        cls.student = seed_students(cls.course, 1, attempts=0)[0]
+        activity = ReadingActivity.objects.get(course__type=cls.course)
+        ReadingTime.objects.bulk_create([ReadingTime(id=day + 1, student=cls.student, activity=activity, start=datetime(2022, 6, 1 + day, 10),
+                                                     end=datetime(2022, 6, 1 + day, 11), duration=timedelta(hours=1)) for day in range(14)])
+        rebuild_reading_summary()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_streamed_export(self):
+        others = seed_students(self.course, 4, attempts=0, start=1)
+        activity = ReadingActivity.objects.get(course__type=self.course)
+        ReadingTime.objects.bulk_create([ReadingTime(id=100 + n, student=student, activity=activity, start=datetime(2022, 6, 1, 10),
+                                                     end=datetime(2022, 6, 1, 10, 30), duration=timedelta(minutes=30)) for n, student in enumerate(others[1:])])
+        rebuild_reading_summary()
+        with mock.patch('ctkirep.reports.STREAM_CHUNK', 2), mock.patch('ctkirep.exports.CSV_BLOCK', 3):
+            response = self.client.post(reverse('reading_time_export'), {'course': self.course.id, 'start_date': '', 'end_date': ''})
+            self.assertTrue(response.streaming)
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 1 + 5 * 1)
+        self.assertEqual([line.split(',')[6] for line in lines[1:]], ['14:00:00', '', '00:30:00', '00:30:00', '00:30:00'])
+
+    def add_readers(self, count, start):
+        activity = ReadingActivity.objects.get(course__type=self.course)
+        students = seed_students(self.course, count, attempts=0, start=start)
+        ReadingTime.objects.bulk_create([ReadingTime(id=100 + start + n, student=student, activity=activity, start=datetime(2022, 6, 1, 10),
+                                                     end=datetime(2022, 6, 1, 10, 30), duration=timedelta(minutes=30)) for n, student in enumerate(students)])
+        rebuild_reading_summary()
+        cache.clear()
+
+    def report_queries(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('reading_time_report', args=[self.course.id]))
+        self.assertEqual(response.status_code, 200)
+        request = RequestFactory().get('/')
+        request.user = self.user
+        with CaptureQueriesContext(connection) as details:
+            ReadingTimeDetailsView.as_view()(request, course=self.course.id, id=self.student.id).render()
+        return response, len(ctx.captured_queries), len(details.captured_queries)
+
+    def test_query_count_does_not_grow_with_cohort(self):
+        self.add_readers(1, 1)
+        response, small, small_details = self.report_queries()
+        self.add_readers(20, 2)
+        response, large, large_details = self.report_queries()
+        self.assertEqual(small, large)
+        self.assertEqual(small_details, large_details)
+        self.assertLessEqual(large, 7)
+        self.assertEqual(len(response.context['data']), 22)
+        self.assertEqual(response.context['data'][self.student.id][0]['totaltime'], timedelta(hours=14))
+
+    def test_summary_drops_pairs_without_sessions(self):
+        activity = ReadingActivity.objects.get(course__type=self.course)
+        other = seed_students(self.course, 1, attempts=0, start=1)[0]
+        ReadingTime.objects.create(id=100, student=other, activity=activity, start=datetime(2022, 6, 1, 10), end=datetime(2022, 6, 1, 11), duration=timedelta(hours=1))
+        update_reading_summary([self.student.id, other.id], [activity.id])
+        ReadingTime.objects.filter(student=other).delete()
+        update_reading_summary([self.student.id, other.id], [activity.id])
+        self.assertEqual(list(ReadingTimeSummary.objects.values_list('student_id', 'totaltime')), [(self.student.id, timedelta(hours=14))])
+        data = self.client.get(reverse('reading_time_report', args=[self.course.id])).context['data']
+        self.assertIsNone(data[other.id][0]['totaltime'])
+
+    def test_bad_report_reports_position(self):
+        path = os.path.join(tempfile.mkdtemp(), 'rt.xml')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('<report><tracking>{0}</tracking></report>'.format(''.join(
+                '<result><identifier>{0}</identifier><activity>ATPL book 0</activity><starttime>{1}</starttime></result>'.format(self.student.reading_username, start)
+                for start in ('01/07/2022 10:00:00', '2022-07-02 10:00'))))
+        self.assertRegex(bulk_reading_time(path), r"^file .*rt\.xml, result 2: time data '2022-07-02 10:00' does not match")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('<report>\n<tracking>\n<result>\n</report>')
+        self.assertRegex(bulk_reading_time(path), r'^Invalid XML file: .*rt\.xml, line 4$')
+        self.assertEqual(ReadingTime.objects.count(), 14)
+
+    def test_date_range(self):
+        url = reverse('reading_time_report', args=[self.course.id])
+        full = self.client.get(url).context['data'][self.student.id][0]
+        self.assertEqual(full['totaltime'], timedelta(hours=14))
+        # The end date is inclusive, as in the exports
+        week = self.client.get(url, {'start_date': '2022-06-01', 'end_date': '2022-06-08'}).context['data'][self.student.id][0]
+        self.assertEqual(week['totaltime'], timedelta(hours=8))
+        self.assertEqual(week['last_time'], datetime(2022, 6, 8, 11))
+
+        response = self.client.get(reverse('api_course_reading_time', args=[self.course.id]), {'start_date': '2022-06-08'})
+        self.assertEqual(response.json()['students'][0]['rows'][0]['total'], 'P0DT07H00M00S')
+        response = self.client.get(reverse('api_course_reading_time', args=[self.course.id]), {'start_date': '2022-06-08', 'end_date': '2022-06-08'})
+        self.assertEqual(response.json()['students'][0]['rows'][0]['total'], 'P0DT01H00M00S')
+        self.assertEqual(self.client.get(reverse('api_course_reading_time', args=[self.course.id]), {'end_date': 'June'}).status_code, 400)
+
+
+class CohortAnalyticsTests(TestCase):
+    def test_quartiles_and_rates(self):
+        course = seed_course(subjects=1, activities=2)
+        Course.objects.filter(type=course).update(reqtime=timedelta(hours=2))
+        students = seed_students(course, 5)
+        activity = ReadingActivity.objects.get(course__type=course)
+        # 0, 1, 2, 3 and 4 hours of reading
+        ReadingTime.objects.bulk_create([ReadingTime(id=n * 10 + k, student=student, activity=activity, start=datetime(2022, 6, 1, k), end=datetime(2022, 6, 1, k + 1),
+                                                     duration=timedelta(hours=1)) for n, student in enumerate(students) for k in range(n)])
+        rebuild_reading_summary()
+
+        with CaptureQueriesContext(connection) as ctx:
+            row = cohort_analytics(course.id)[0]
+        self.assertLessEqual(len(ctx.captured_queries), 5)
+        self.assertEqual((row['p25'], row['median'], row['p75']), (timedelta(hours=1), timedelta(hours=2), timedelta(hours=3)))
+        self.assertEqual((row['meeting'], row['students']), (3, 5))
+        self.assertEqual((row['tests'], row['pass_rate'], row['avg_attempts']), (10, 1.0, 3))
+
+
+    def interpolated(self):
+        course = seed_course(subjects=1, activities=1)
+        students = seed_students(course, 4, attempts=1)
+        activity = ReadingActivity.objects.get(course__type=course)
+        # 0, 1, 2 and 3 hours of reading, quartiles fall between the ranks
+        ReadingTime.objects.bulk_create([ReadingTime(id=n * 10 + k, student=student, activity=activity, start=datetime(2022, 6, 1, k), end=datetime(2022, 6, 1, k + 1),
+                                                     duration=timedelta(hours=1)) for n, student in enumerate(students) for k in range(n)])
+        rebuild_reading_summary()
+        with CaptureQueriesContext(connection) as ctx:
+            row = cohort_analytics(course.id)[0]
+        self.assertEqual((row['p25'], row['median'], row['p75']), (timedelta(minutes=45), timedelta(minutes=90), timedelta(minutes=135)))
+        return ' '.join(query['sql'] for query in ctx.captured_queries)
+
+    def test_interpolated_quartiles(self):
+        # Computed by the database, the summary rows are not fetched
+        self.assertNotIn('FROM "ctkirep_readingtimesummary"', self.interpolated())
+
+    @skipUnless(connection.vendor == 'postgresql', 'percentile_cont is PostgreSQL only')
+    def test_percentile_cont(self):
+        self.assertIn('percentile_cont', self.interpolated())
+
+
+class ImportJobTests(TransactionTestCase):
+    # Imports run in a worker thread on its own connection, so the data has to be committed
+    def setUp(self):
+        self.course = seed_course(subjects=1)
+        self.student = seed_students(self.course, 1, attempts=0)[0]
+        self.client.force_login(User.objects.create_user('trainer'))
+
+    def reading_job(self, sessions=3):
+        path = os.path.join(tempfile.mkdtemp(), 'rt.xml')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('<report><tracking>{0}</tracking></report>'.format(''.join(
+                '<result><identifier>{0}</identifier><activity>ATPL book 0</activity><starttime>{1:02}/07/2022 10:00:00</starttime>'
+                '<endtime>{1:02}/07/2022 10:30:00</endtime></result>'.format(self.student.reading_username, n + 1) for n in range(sessions))))
+        return ImportJob.objects.create(kind=ImportJob.READING_TIME, path=path)
+
+    def run_queue(self):
+        call_command('runimportjobs', '--once', stdout=io.StringIO())
+
+    def status(self, job):
+        return self.client.get(reverse('import_job_status', args=[job.id])).json()
+
+    def test_job_lifecycle(self):
+        job = self.reading_job()
+        self.assertEqual(self.status(job)['status'], ImportJob.QUEUED)
+        self.run_queue()
+        status = self.status(job)
+        self.assertEqual((status['status'], status['rows'], status['attempts'], status['stalled']), (ImportJob.DONE, 3, 1, False))
+        self.assertTrue(status['message'].startswith('OK, 3 new rows inserted'))
+        self.assertEqual(ReadingTime.objects.filter(student=self.student).count(), 3)
+        self.assertFalse(os.path.exists(job.path))
+
+        # Sessions up to the last one already loaded are skipped on the next upload
+        again = self.reading_job(sessions=4)
+        self.run_queue()
+        self.assertTrue(self.status(again)['message'].startswith('OK, 1 new rows inserted'))
+        self.assertEqual(ReadingTime.objects.filter(student=self.student).count(), 4)
+
+    def test_failed_job(self):
+        job = ImportJob.objects.create(kind=ImportJob.JOURNEY, path=os.path.join(tempfile.mkdtemp(), 'missing.csv'))
+        with mock.patch('ctkirep.management.commands.runimportjobs.IMPORTERS', {ImportJob.JOURNEY: mock.Mock(side_effect=ValueError('broken'))}):
+            self.run_queue()
+        status = self.status(job)
+        self.assertEqual(status['status'], ImportJob.FAILED)
+        self.assertIn('ValueError: broken', status['message'])
+
+    def test_progress_reported_while_running(self):
+        job = self.reading_job()
+        ImportJob.objects.filter(id=job.id).update(status=ImportJob.RUNNING, phase='importing', rows=2000, started=datetime.now(), heartbeat=datetime.now())
+        status = self.status(job)
+        self.assertEqual((status['status'], status['phase'], status['rows'], status['stalled']), (ImportJob.RUNNING, 'importing', 2000, False))
+
+    def test_stalled_jobs_released(self):
+        stale = datetime.now() - timedelta(hours=1)
+        retried = self.reading_job()
+        ImportJob.objects.filter(id=retried.id).update(status=ImportJob.RUNNING, phase='importing', started=stale, heartbeat=stale, attempts=1)
+        given_up = self.reading_job()
+        ImportJob.objects.filter(id=given_up.id).update(status=ImportJob.RUNNING, phase='importing', started=stale, heartbeat=stale, attempts=2)
+        self.assertTrue(self.status(retried)['stalled'])
+
+        self.run_queue()
+        retried.refresh_from_db()
+        given_up.refresh_from_db()
+        self.assertEqual((retried.status, retried.attempts), (ImportJob.DONE, 2))
+        self.assertEqual(given_up.status, ImportJob.FAILED)
+        self.assertIn('2 attempts made', given_up.message)
+
+    @skipUnless(connection.vendor == 'postgresql', 'SKIP LOCKED needs row locks')
+    def test_claim_skips_locked_jobs(self):
+        first, second = self.reading_job(), self.reading_job()
+        locked, release = threading.Event(), threading.Event()
+
+        def hold():
+            with transaction.atomic():
+                list(ImportJob.objects.select_for_update().filter(id=first.id))
+                locked.set()
+                release.wait(10)
+            connection.close()
+
+        worker = threading.Thread(target=hold)
+        worker.start()
+        try:
+            locked.wait(10)
+            self.assertEqual(ImportJobsCommand().claim_job().id, second.id)
+        finally:
+            release.set()
+            worker.join()
+
+    @skipUnless(connection.vendor == 'postgresql', 'Advisory locks are PostgreSQL only')
+    def test_reading_time_imports_run_one_at_a_time(self):
+        # Another worker's import holds the lock: this one waits for it before reading the next id
+        job = self.reading_job()
+        done = threading.Event()
+
+        def worker():
+            self.run_queue()
+            connection.close()
+            done.set()
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_lock(%s)', [READING_TIME_LOCK])
+            thread = threading.Thread(target=worker)
+            thread.start()
+            try:
+                self.assertFalse(done.wait(1))
+                ReadingTime.objects.create(id=5, student=self.student, activity=ReadingActivity.objects.get(name='ATPL book 0'),
+                                           start=datetime(2022, 6, 1, 10), end=datetime(2022, 6, 1, 11), duration=timedelta(hours=1))
+            finally:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [READING_TIME_LOCK])
+                thread.join()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ImportJob.DONE, job.message)
+        self.assertEqual(sorted(ReadingTime.objects.values_list('id', flat=True)), [5, 6, 7, 8])
+
+class UploadDedupeTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.client.force_login(User.objects.create_user('trainer'))
+
+    def upload(self, content=b'<report><tracking></tracking></report>'):
+        upload = io.BytesIO(content)
+        upload.name = 'rt.xml'
+        response = self.client.post(reverse('reading_time_upload'), {'timestamp': '2022-07-01 10:00:00', 'file': upload})
+        return response.context['form'].initial['upload_status']
+
+    def test_identical_file_not_queued_twice(self):
+        self.assertRegex(self.upload(), r'^Queued as import job #\d+$')
+        job = ImportJob.objects.get()
+        self.assertEqual(self.upload(), 'File already queued as import job #{0}'.format(job.id))
+        ImportJob.objects.filter(id=job.id).update(status=ImportJob.RUNNING)
+        self.assertEqual(self.upload(), 'File already queued as import job #{0}'.format(job.id))
+        ImportJob.objects.filter(id=job.id).update(status=ImportJob.DONE, finished=datetime(2022, 7, 1, 10, 5))
+        self.assertEqual(self.upload(), 'File already imported on 01.07.2022 10:05 (import job #{0})'.format(job.id))
+        self.assertRegex(self.upload(b'<report><tracking> </tracking></report>'), r'^Queued as import job #\d+$')
+        self.assertEqual(ImportJob.objects.count(), 2)
+
+    def test_failed_import_can_be_retried(self):
+        self.upload()
+        ImportJob.objects.update(status=ImportJob.FAILED)
+        self.assertRegex(self.upload(), r'^Queued as import job #\d+$')
+        self.assertEqual(ImportJob.objects.filter(status=ImportJob.QUEUED).count(), 1)
+
+class CompressedReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = seed_course(subjects=1)
+        cls.student = seed_students(cls.course, 1, attempts=0)[0]
+
+    def reading_xml(self):
+        return '<report><tracking>{0}</tracking></report>'.format(''.join(
+            '<result><identifier>{0}</identifier><activity>ATPL book 0</activity><starttime>0{1}/07/2022 10:00:00</starttime>'
+            '<endtime>0{1}/07/2022 10:30:00</endtime></result>'.format(self.student.reading_username, day) for day in (1, 2))).encode()
+
+    def status_csv(self):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(ContentStatusImportTests.HEADER)
+        writer.writerow([self.student.pt_username, 'A', 'B', '', '2022-05-01T00:00:00.000Z', '', '', '', '', 'ATPL PT 0.0', 'Test', 'passed', '90', '', ''])
+        return buf.getvalue().encode()
+
+    def report(self, name, content):
+        path = os.path.join(tempfile.mkdtemp(), name)
+        if name.endswith('.gz'):
+            with gzip.open(path, 'wb') as f:
+                f.write(content)
+        elif isinstance(content, dict):
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+                for member in content:
+                    zf.writestr(member, content[member])
+        else:
+            with open(path, 'wb') as f:
+                f.write(content)
+        return path
+
+    def test_gzip_reports(self):
+        self.assertTrue(bulk_reading_time(self.report('rt.xml.gz', self.reading_xml())).startswith('OK, 2 new rows inserted'))
+        self.assertTrue(ace_contentstatus(self.report('ContentStatus.csv.gz', self.status_csv())).startswith('OK, 0 records created, 1 records updated'))
+        self.assertEqual(ReadingTime.objects.filter(student=self.student).count(), 2)
+        self.assertEqual(ACEContentStatus.objects.get(student=self.student, activity__name='ATPL PT 0.0').score, Decimal(90))
+
+    def test_zip_reports(self):
+        path = self.report('rt.zip', {'export/': b'', 'export/rt.xml': self.reading_xml()})
+        self.assertTrue(bulk_reading_time(path).startswith('OK, 2 new rows inserted'))
+        path = self.report('ContentStatus.zip', {'ContentStatus.csv': self.status_csv()})
+        self.assertTrue(ace_contentstatus(path).startswith('OK, 0 records created, 1 records updated'))
+
+        path = self.report('rt.zip', {'rt.xml': self.reading_xml(), 'readme.txt': b'notes'})
+        self.assertEqual(bulk_reading_time(path), 'Zip file must contain exactly one report: ' + path)
+        self.assertEqual(ReadingTime.objects.filter(student=self.student).count(), 2)
+
+    def test_corrupt_archives(self):
+        data = gzip.compress(self.reading_xml())
+        path = self.report('rt.xml', data[:len(data) // 2])
+        self.assertEqual(bulk_reading_time(path), 'Invalid compressed file: ' + path)
+        path = self.report('ContentStatus.csv', data[:10] + b'garbage' + data[17:])
+        self.assertEqual(ace_contentstatus(path), 'Invalid compressed file: ' + path)
+        path = self.report('rt.zip', b'PK\x03\x04' + b'\0' * 40)
+        self.assertEqual(bulk_reading_time(path), 'Invalid compressed file: ' + path)
+        self.assertFalse(ReadingTime.objects.exists())
+
+    def test_upload_forms_check_extensions(self):
+        for form_class, suffix in ((UploadFileForm, '.xml'), (PTFileForm, '.csv')):
+            for name, valid in (('report' + suffix, True), ('REPORT' + suffix.upper() + '.GZ', True), ('report.zip', True),
+                                ('report.gz', False), ('report' + suffix + '.bz2', False), ('report.txt', False)):
+                form = form_class({'timestamp': '2022-07-01 10:00:00'}, {'file': SimpleUploadedFile(name, b'data')})
+                self.assertEqual(form.is_valid(), valid, name)
+                if not valid:
+                    self.assertEqual(form.errors['file'], ['Expected a {0} file, optionally compressed as {0}.gz or .zip'.format(suffix)])
+
+class ContentStatusImportTests(TestCase):
+    HEADER = ['Username', 'First name', 'Surname', 'Groups', 'Timestamp', 'Date', 'Time', 'Activity ID', 'Activity external reference',
+              'Activity name', 'Display type', 'Status', 'Score', 'CPD points', 'Learning hours']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = seed_course(subjects=1)
+        cls.student = seed_students(cls.course, 1)[0]
+
+    def status(self, scores):
+        # (activity, score) rows, the seeded ones are passed on 1 May with 85
+        rows = [[self.student.pt_username, 'A', 'B', '', '2022-05-01T00:00:00.000Z', '', '', '', '', 'ATPL PT 0.{0}'.format(k), 'Test', 'passed', score, '', '']
+                for k, score in scores]
+        path = os.path.join(tempfile.mkdtemp(), 'ContentStatus.csv')
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.HEADER)
+            writer.writerows(rows)
+        return ace_contentstatus(path)
+
+    def scores(self):
+        return list(ACEContentStatus.objects.filter(student=self.student).order_by('activity__name').values_list('score', flat=True))
+
+    def test_unchanged_rows_are_skipped(self):
+        result = self.status([(k, '85') for k in range(4)])
+        self.assertTrue(result.startswith('OK, 0 records created, 0 records updated, 4 total records in file'))
+        self.assertRegex(result, r'\[header [\d.]+s/1 rows, references [\d.]+s/1 rows, prepare [\d.]+s/1 rows, read ')
+        self.assertEqual(self.scores(), [Decimal(85)] * 4)
+
+    def test_created_and_updated(self):
+        ACEContentStatus.objects.filter(student=self.student, activity__name='ATPL PT 0.3').delete()
+        # The last line of a pair wins
+        result = self.status([(0, '85'), (1, '90'), (2, '60'), (2, '70'), (3, '75')])
+        self.assertTrue(result.startswith('OK, 1 records created, 2 records updated, 5 total records in file'))
+        self.assertEqual(self.scores(), [Decimal(85), Decimal(90), Decimal(70), Decimal(75)])
+        self.assertTrue(self.status([(3, '75')]).startswith('OK, 0 records created, 0 records updated, 1 total records in file'))
+
+    def test_bad_cell_reports_line(self):
+        self.assertRegex(self.status([(0, '85'), (1, 'n/a')]), r'^file .*ContentStatus\.csv, line 3: ')
+        self.assertEqual(self.scores(), [Decimal(85)] * 4)
+
+class JourneyImportTests(TestCase):
+    HEADER = ['Username', 'First name', 'Surname', 'Groups', 'Timestamp', 'Date', 'Time', 'Attempt', 'Duration', 'Statement ID', 'Course ID',
+              'Course', 'Activity ID', 'Activity name', 'Type', 'Action', 'Response', 'Mark', 'Score']
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = seed_course(subjects=1)
+        cls.student = seed_students(cls.course, 1, attempts=0)[0]
+
+    def journey(self, statement_ids):
+        rows = [[self.student.pt_username, 'A', 'B', '', '2022-07-01T10:0{0}:00.000Z'.format(n % 3), '', '', str(n // 3 + 1), 'PT1M', stmt, '',
+                 'ATPL PT 0.{0}'.format(n % 2), '', '', 'Test', 'passed', '', '', '90'] for n, stmt in enumerate(statement_ids)]
+        path = os.path.join(tempfile.mkdtemp(), 'LearnerJourney.csv')
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(self.HEADER)
+            writer.writerows(rows)
+        return ace_journeyreport(path)
+
+    def stats(self):
+        return list(ACEActivityStats.objects.filter(student=self.student).order_by('activity_id').values_list('attempts', 'totaltime'))
+
+    def test_reupload_inserts_nothing(self):
+        statement_ids = ['stmt-{0}'.format(n) for n in range(4)] + ['', '']
+        self.assertTrue(self.journey(statement_ids).startswith('OK, 6 records created'))
+        stats = self.stats()
+        self.assertTrue(self.journey(statement_ids).startswith('OK, 0 records created'))
+        self.assertEqual(ACELearnerJourney.objects.filter(student=self.student).count(), 6)
+        self.assertEqual(self.stats(), stats)
+
+    def test_rows_without_statement_id_are_matched(self):
+        # Loaded before the Statement ID column existed, then uploaded again with it
+        self.journey([''] * 6)
+        stats = self.stats()
+        self.assertTrue(self.journey(['stmt-{0}'.format(n) for n in range(6)]).startswith('OK, 0 records created, 6 existing records'))
+        self.assertEqual(ACELearnerJourney.objects.filter(student=self.student).count(), 6)
+        self.assertEqual(ACELearnerJourney.objects.filter(statement_id__isnull=True).count(), 0)
+        self.assertEqual(self.stats(), stats)
+        self.assertTrue(self.journey(['stmt-{0}'.format(n) for n in range(7)]).startswith('OK, 1 records created, 0 existing records'))
+
+class ExportAllCoursesTests(TransactionTestCase):
+    # Courses are built in worker threads on their own connections, so the data has to be committed
+    def test_zip_archive(self):
+        user = User.objects.create_user('trainer')
+        for name in ('ATPL', 'CPL/IR'):
+            seed_students(seed_course(name, subjects=2), 2)
+        # Sanitised to the same name as CPL/IR
+        other = CourseType.objects.create(name='CPL_IR', sorder=1)
+        self.client.force_login(user)
+
+        response = self.client.get(reverse('export_all_courses'))
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(sorted(archive.namelist()), ['ProgressTests_ATPL.csv', 'ProgressTests_CPL_IR.csv', 'ProgressTests_CPL_IR_{0}.csv'.format(other.id),
+                                                      'ReadingTime_ATPL.csv', 'ReadingTime_CPL_IR.csv', 'ReadingTime_CPL_IR_{0}.csv'.format(other.id), 'timings.csv'])
+        self.assertEqual(len(archive.read('ProgressTests_CPL_IR.csv').decode().splitlines()), 1 + 2 * 8)
+        self.assertEqual(len(archive.read('ProgressTests_CPL_IR_{0}.csv'.format(other.id)).decode().splitlines()), 1)
+        timings = list(csv.reader(archive.read('timings.csv').decode().splitlines()))
+        self.assertEqual([row[:2] + row[3:] for row in timings[1:]], [['ATPL', 'OK', '4', '16'], ['CPL/IR', 'OK', '4', '16'], ['CPL_IR', 'OK', '0', '0']])
+
+    def test_course_past_deadline_is_abandoned(self):
+        course = seed_course()
+        seed_students(course, 2)
+        with self.assertRaises(TimeoutError):
+            course_csv_files(course.id, time.monotonic() - 1)
+        self.assertEqual(len(course_csv_files(course.id, time.monotonic() + 60)[2]), 3)
+
+    def test_filenames_are_sanitised(self):
+        self.assertTrue(reading_time_filename('CPL/IR ../x', None, None).startswith('ReadingTime_CPL_IR_.._x_start_'))
+        self.assertTrue(progress_test_filename('A\\B').startswith('ProgressTests_A_B_'))
+
+class ExportSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('trainer')
+        cls.course = seed_course(subjects=2)
+        seed_students(cls.course, 2)
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.client.force_login(self.user)
+        call_command('snapshotexports', stdout=io.StringIO())
+
+    def export(self):
+        response = self.client.get(reverse('csv_export_pt', args=[self.course.id]))
+        self.assertEqual(response.status_code, 200)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_snapshot_served_while_current(self):
+        self.assertEqual(ExportSnapshot.objects.filter(course=self.course).count(), 4)
+        response, snapshot = self.export()
+        self.assertIsInstance(response, FileResponse)
+        self.assertEqual(len(snapshot.splitlines()), 1 + 2 * 8)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ACEContentStatus.objects.filter(student__course=self.course).update(score=Decimal(50))
+            bump_data_version([self.course.id])
+        response, live = self.export()
+        self.assertNotIsInstance(response, FileResponse)
+        self.assertNotEqual(live, snapshot)
+
+        call_command('snapshotexports', stdout=io.StringIO())
+        response, rebuilt = self.export()
+        self.assertIsInstance(response, FileResponse)
+        self.assertEqual(rebuilt, live)
+        self.assertEqual(len(os.listdir(os.path.join(settings.MEDIA_ROOT, 'snapshots'))), 4)
+
+    def test_setup_edits_retire_snapshots(self):
+        # Activity names and subject codes are written into the exports
+        rt_export = {'course': self.course.id, 'start_date': '', 'end_date': ''}
+        with self.captureOnCommitCallbacks(execute=True):
+            activity = ReadingActivity.objects.filter(course__type=self.course).first()
+            activity.name = 'Renamed'
+            activity.save()
+        self.assertNotIsInstance(self.client.post(reverse('reading_time_export'), rt_export), FileResponse)
+
+        call_command('snapshotexports', stdout=io.StringIO())
+        self.assertIsInstance(self.export()[0], FileResponse)
+        with self.captureOnCommitCallbacks(execute=True):
+            subject = CourseSubject.objects.filter(course__type=self.course).first()
+            subject.code = 'X01'
+            subject.save()
+        response, live = self.export()
+        self.assertNotIsInstance(response, FileResponse)
+        self.assertIn('X01', live)
+
+    def test_overlapping_run_is_skipped(self):
+        held, done = threading.Event(), threading.Event()
+
+        def hold():
+            try:
+                with snapshot_lock():
+                    held.set()
+                    done.wait(10)
+            finally:
+                connection.close()
+        worker = threading.Thread(target=hold)
+        worker.start()
+        held.wait(10)
+        out = io.StringIO()
+        try:
+            call_command('snapshotexports', stdout=out)
+        finally:
+            done.set()
+            worker.join()
+        self.assertEqual(out.getvalue(), 'Another snapshot run is in progress\n')
+
+    def test_custom_range_streamed(self):
+        response = self.client.post(reverse('reading_time_export'), {'course': self.course.id, 'start_date': '2022-04-01', 'end_date': '2022-06-01'})
+        self.assertNotIsInstance(response, FileResponse)
+        response = self.client.post(reverse('reading_time_export'), {'course': self.course.id, 'start_date': '', 'end_date': ''})
+        self.assertIsInstance(response, FileResponse)
+
+class EventExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('trainer')
+        cls.course = seed_course(subjects=2)
+        cls.students = seed_students(cls.course, 3)
+        seed_students(seed_course('PPL', subjects=1), 2)
+        activity = ReadingActivity.objects.filter(course__type=cls.course).first()
+        # Sessions sharing start times, so pages break between equal keys
+        ReadingTime.objects.bulk_create([ReadingTime(id=1000 - n, student=cls.students[n % 3], activity=activity, start=datetime(2022, 6, 1 + n // 4, 10),
+                                                     end=datetime(2022, 6, 1 + n // 4, 11), duration=timedelta(hours=1)) for n in range(20)])
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def export(self, kind, **params):
+        with mock.patch('ctkirep.exports.EVENT_PAGE', 3), CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('api_course_' + kind, args=[self.course.id]), params)
+            body = b''.join(response.streaming_content).decode()
+        self.assertNotIn('OFFSET', ' '.join(query['sql'] for query in ctx.captured_queries))
+        return response, body
+
+    def test_sessions_csv(self):
+        response, body = self.export('sessions', start_date='2022-06-02', end_date='2022-06-04')
+        rows = list(csv.DictReader(body.splitlines()))
+        expected = ReadingTime.objects.filter(start__gte=datetime(2022, 6, 2), start__lt=datetime(2022, 6, 5)).order_by('start', 'id')
+        self.assertEqual([int(row['id']) for row in rows], [rt.id for rt in expected])
+        self.assertEqual(len(rows), 12)
+        names = {str(student.id): student.name for student in self.students}
+        self.assertEqual([row['name'] for row in rows], [names[row['student_id']] for row in rows])
+
+    def test_journey_ndjson(self):
+        student = self.students[1]
+        response, body = self.export('journey', student=student.id, format='ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        expected = ACELearnerJourney.objects.filter(student=student).order_by('timestamp', 'id')
+        self.assertEqual([row['id'] for row in rows], [event.id for event in expected])
+        self.assertEqual(len(rows), 8 * 3)
+        self.assertEqual({row['status'] for row in rows}, {'passed'})
+
+    def test_invalid_filters(self):
+        url = reverse('api_course_sessions', args=[self.course.id])
+        self.assertEqual(self.client.get(url, {'start_date': 'soon'}).status_code, 400)
+        other = Student.objects.exclude(course=self.course).first()
+        self.assertEqual(self.client.get(url, {'student': other.id}).status_code, 404)
+
+class PTStatusReportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('trainer')
+        cls.course = seed_course()
+        cls.other = seed_course('PPL', subjects=1)
+        seed_students(cls.other, 2, attempts=7)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def report_queries(self, **params):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('progress_tests_report', args=[self.course.id]), params)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_query_count_does_not_grow_with_cohort(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            seed_students(self.course, 2)
+        response, small = self.report_queries()
+        with self.captureOnCommitCallbacks(execute=True):
+            seed_students(self.course, 20, start=2)
+        response, large = self.report_queries()
+        self.assertEqual(small, large)
+        self.assertLessEqual(large, 6)
+        self.assertEqual(len(response.context['data']), 22)
+
+    def test_max_attempt_per_student_and_activity(self):
+        students = seed_students(self.course, 2, attempts=3)
+        ACELearnerJourney.objects.filter(student=students[1], attempt=3).delete()
+        rebuild_ace_stats()
+        response, queries = self.report_queries()
+        data = response.context['data']
+        self.assertEqual(len(data[students[0].id]), 12)
+        self.assertEqual({row['max_attempt'] for row in data[students[0].id]}, {3})
+        self.assertEqual({row['max_attempt'] for row in data[students[1].id]}, {2})
+        self.assertEqual([row['activity__subject__course__subject_order'] for row in data[students[0].id]], sorted(i for i in range(3) for k in range(4)))
+
+    def test_date_bounded_export(self):
+        students = seed_students(self.course, 2, attempts=3)
+        first = ACELearnerJourney.objects.filter(student=students[0], attempt=3).first()
+        ACELearnerJourney.objects.create(student=students[0], activity=first.activity, action=first.action, timestamp=datetime(2022, 6, 1), attempt=4, response='')
+        rebuild_ace_stats()
+
+        def export(start_date, end_date):
+            response = self.client.post(reverse('progress_test_export'), {'course': self.course.id, 'start_date': start_date, 'end_date': end_date})
+            return list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))[1:]
+
+        full = export('', '')
+        self.assertEqual(len(full), 24)
+        self.assertEqual(sorted({row[-1] for row in full}), ['3', '4'])
+        window = export('2022-05-01', '2022-05-01')
+        self.assertEqual({row[0] for row in window}, {students[0].name})
+        self.assertEqual(len(window), 12)
+        self.assertEqual({row[-1] for row in window}, {'3'})
+        self.assertEqual({row[0] for row in export('2022-05-02', '')}, {students[1].name})
+
+    def test_report_cached_until_data_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            students = seed_students(self.course, 2)
+        response, first = self.report_queries()
+        response, cached = self.report_queries()
+        self.assertLess(cached, first)
+        self.assertEqual(len(response.context['data']), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            students[1].active = False
+            students[1].save()
+        response, queries = self.report_queries()
+        self.assertEqual(queries, first)
+        self.assertEqual(list(response.context['data']), [students[0].id])
+
+    def test_large_cohort_report(self):
+        # Timings are left to the benchreports command
+        seed_students(self.course, 60, attempts=10)
+        response, queries = self.report_queries(lazy='0')
+        self.assertEqual(len(response.context['data']), 60)
+        self.assertLessEqual(queries, 6)
+
+    def test_lazy_report_loads_tables_per_student(self):
+        students = seed_students(self.course, 3)
+        response = self.client.get(reverse('progress_tests_report', args=[self.course.id]), {'lazy': '1'})
+        self.assertTrue(response.context['lazy'])
+        self.assertNotIn('data', response.context)
+        self.assertEqual(response.context['overview'][students[0].id], {'tests': 12, 'passed': 12})
+
+        response = self.client.get(reverse('progress_test_student', args=[self.course.id, students[0].id]))
+        rows = response.json()['rows']
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(rows[0][4], {'v': 'PASSED', 'c': 'oklabel'})
+        self.assertEqual(rows[0][7], 3)
+        self.assertEqual(self.client.get(reverse('progress_test_student', args=[self.other.id, students[0].id])).status_code, 404)
+
+    def test_api_conditional_get(self):
+        imported = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            students = seed_students(self.course, 2)
+        url = reverse('api_course_progress_tests', args=[self.course.id])
+        response = self.client.get(url)
+        # The header is the import time, converted from local time
+        last_modified = parse_http_date(response['Last-Modified'])
+        self.assertLessEqual(int(timezone.make_aware(imported).timestamp()), last_modified)
+        self.assertLessEqual(last_modified, timezone.make_aware(timezone.now()).timestamp())
+        self.assertEqual([student['id'] for student in response.json()['students']], [student.id for student in students])
+        self.assertEqual(len(response.json()['students'][0]['rows']), 12)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            students[1].active = False
+            students[1].save()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+        self.assertEqual(len(changed.json()['students']), 1)
+
+class ACEActivityStatsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.course = seed_course(subjects=1, activities=1)
+        cls.student = seed_students(cls.course, 1, attempts=0)[0]
+        cls.activity = ACEActivity.objects.get(subject__course__type=cls.course)
+        cls.passed = ACEStatus.objects.get(name='passed')
+
+    def journey(self, attempt, minute, score, seconds=60):
+        return ACELearnerJourney(student=self.student, activity=self.activity, action=self.passed, timestamp=datetime(2022, 6, 1, 10, minute),
+                                 attempt=attempt, duration=timedelta(seconds=seconds), response='', score=score)
+
+    def test_incremental_update(self):
+        ACELearnerJourney.objects.bulk_create([self.journey(1, 0, None), self.journey(1, 5, Decimal(60)), self.journey(2, 10, Decimal(90))])
+        update_ace_stats({self.student.id}, {self.activity.id})
+        ACELearnerJourney.objects.bulk_create([self.journey(3, 20, Decimal(70))])
+        update_ace_stats({self.student.id}, {self.activity.id})
+
+        stats = ACEActivityStats.objects.get(student=self.student, activity=self.activity)
+        self.assertEqual((stats.max_attempt, stats.attempts), (3, 3))
+        self.assertEqual((stats.best_score, stats.last_score), (Decimal(90), Decimal(70)))
+        self.assertEqual(stats.first_pass, datetime(2022, 6, 1, 10, 10))
+        self.assertEqual(stats.totaltime, timedelta(minutes=4))
+
+
+class QueryPlanTests(TestCase):
+    # Report and import queries must reach the big tables through an index
+    BIG_TABLES = ('ctkirep_readingtime', 'ctkirep_acelearnerjourney', 'ctkirep_acecontentstatus')
+    SQL_KEYWORDS = {'ON', 'WHERE', 'LEFT', 'RIGHT', 'INNER', 'OUTER', 'FULL', 'CROSS', 'JOIN', 'GROUP', 'ORDER', 'LIMIT', 'USING', 'NATURAL'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('trainer')
+        cls.course = seed_course()
+        cls.other = seed_course('PPL')
+        for course in (cls.course, cls.other):
+            students = seed_students(course, 30, attempts=4)
+            activities = list(ReadingActivity.objects.filter(course__type=course))
+            ReadingTime.objects.bulk_create([
+                ReadingTime(id=(student.id * 100 + activity.id) * 100 + n, student=student, activity=activity, start=datetime(2022, 6, 1) + timedelta(days=n),
+                            end=datetime(2022, 6, 1, 1) + timedelta(days=n), duration=timedelta(hours=1))
+                for student in students for activity in activities for n in range(20)])
+        rebuild_reading_summary()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.students = list(Student.objects.filter(course=cls.course))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def table_aliases(self, sql):
+        # SQLite names scanned tables by their alias: alias -> tables it stands for anywhere in the statement
+        aliases = dict()
+        for table, alias in re.findall(r'\b(?:FROM|JOIN)\s+"?(\w+)"?(?:\s+(?:AS\s+)?"?(\w+)"?)?', sql, re.IGNORECASE):
+            aliases.setdefault(table, set()).add(table)
+            if alias and alias.upper() not in self.SQL_KEYWORDS:
+                aliases.setdefault(alias, set()).add(table)
+        return aliases
+
+    def full_scans(self, queries, ordered=False, lookups=False):
+        # lookups: on PostgreSQL every read of a big table must also be an index lookup, not a whole index read
+        settings = ('enable_seqscan', 'enable_mergejoin', 'enable_hashjoin') if lookups else ('enable_seqscan',)
+        scans = list()
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Small test tables are cheaper to scan or to join whole, so only a missing index leaves a full scan
+                for setting in settings:
+                    cursor.execute('SET {0} = off'.format(setting))
+            for query in queries:
+                # Server-side cursors (streamed exports) are declared over the SELECT
+                sql = re.sub(r'^\s*DECLARE .*? CURSOR (?:WITH(?:OUT)? HOLD )?FOR\s', '', query['sql'], flags=re.DOTALL)
+                if not re.match(r'\s*(SELECT|INSERT|UPDATE)\b', sql, re.IGNORECASE):
+                    continue
+                if connection.vendor == 'postgresql':
+                    cursor.execute('EXPLAIN ' + sql)
+                    plan = [row[0] for row in cursor.fetchall()]
+                    walk = ordered and re.search(r'\bORDER BY\b[^()]*\bLIMIT \d+\s*$', sql)
+                    for n, line in enumerate(plan):
+                        m = re.search(r'(Seq Scan|Index (?:Only )?Scan)(?: Backward)?(?: using \w+)? on (\w+)', line)
+                        if not m or m.group(2) not in self.BIG_TABLES:
+                            continue
+                        # An index read without an Index Cond goes through the whole table as well
+                        details = list(itertools.takewhile(lambda detail: '->' not in detail, plan[n + 1:]))
+                        if m.group(1) == 'Seq Scan' or lookups and not (walk or any('Index Cond' in detail for detail in details)):
+                            scans.append((sql, line))
+                else:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                    plan = [row[-1] for row in cursor.fetchall()]
+                    aliases = self.table_aliases(sql)
+                    # The first keyset page may walk the (key, id) index in order instead of sorting
+                    walk = ordered and re.search(r'\bORDER BY\b[^()]*\bLIMIT \d+\s*$', sql)
+                    scanned = [(line, re.search(r'SCAN (\w+)\b(?! USING (?:COVERING )?INDEX)' if walk else r'SCAN (\w+)\b', line)) for line in plan]
+                    scans.extend((sql, line) for line, m in scanned if m and aliases.get(m.group(1), set()) & set(self.BIG_TABLES))
+            if connection.vendor == 'postgresql':
+                for setting in settings:
+                    cursor.execute('RESET {0}'.format(setting))
+        return scans
+
+    def capture(self, func):
+        with CaptureQueriesContext(connection) as ctx:
+            func()
+        return ctx.captured_queries
+
+    def assertIndexed(self, queries, ordered=False):
+        self.assertTrue(queries)
+        self.assertEqual(self.full_scans(queries, ordered), [])
+
+    def test_full_scan_is_detected(self):
+        queries = self.capture(lambda: list(ACELearnerJourney.objects.filter(response='none')))
+        self.assertEqual(len(self.full_scans(queries)), 1)
+
+        def raw():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT j.id FROM ctkirep_acelearnerjourney AS j WHERE j.response = 'none'")
+        self.assertEqual(len(self.full_scans(self.capture(raw))), 1)
+
+        # Walking an index in order is only accepted for keyset pages
+        queries = self.capture(lambda: list(ACELearnerJourney.objects.order_by('timestamp', 'id').values_list('id', flat=True)[:20]))
+        self.assertEqual(self.full_scans(queries, ordered=True), [])
+        if connection.vendor == 'sqlite':
+            self.assertEqual(len(self.full_scans(queries)), 1)
+
+    def test_report_plans(self):
+        student = self.students[0]
+        urls = [
+            (reverse('reading_time_report', args=[self.course.id]), {}),
+            (reverse('reading_time_report', args=[self.course.id]), {'start_date': '2022-06-05', 'end_date': '2022-06-12'}),
+            (reverse('reading_time_report', args=[self.course.id]), {'lazy': '1'}),
+            (reverse('reading_time_student', args=[self.course.id, student.id]), {'end_date': '2022-06-12'}),
+            (reverse('progress_tests_report', args=[self.course.id]), {}),
+            (reverse('progress_tests_report', args=[self.course.id]), {'lazy': '1'}),
+            (reverse('progress_test_student', args=[self.course.id, student.id]), {}),
+            (reverse('csv_export_pt', args=[self.course.id]), {}),
+        ]
+        for url, params in urls:
+            with self.subTest(url=url, params=params):
+                self.assertIndexed(self.capture(lambda: self.fetch(url, params)))
+
+    def fetch(self, url, params):
+        # Streamed responses only run their queries while the content is read
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        if response.streaming:
+            b''.join(response.streaming_content)
+
+    def test_event_export_plans(self):
+        student = self.students[0]
+        for kind in ('sessions', 'journey'):
+            for params in ({}, {'student': student.id}, {'start_date': '2022-05-05', 'end_date': '2022-06-12'}):
+                with self.subTest(kind=kind, params=params), mock.patch('ctkirep.exports.EVENT_PAGE', 20):
+                    url = reverse('api_course_' + kind, args=[self.course.id])
+                    queries = self.capture(lambda: b''.join(self.client.get(url, params).streaming_content))
+                    pages = [query for query in queries if re.search(r'\bLIMIT 20$', query['sql'])]
+                    self.assertGreater(len(pages), 1)
+                    self.assertIndexed(queries[:queries.index(pages[1])], ordered=True)
+                    # Later pages start at the previous key and must seek to it
+                    self.assertIndexed(pages[1:])
+
+    def test_reading_window_is_an_index_range(self):
+        # Both ends of the date window bound the start column of the session index
+        # The window of one student, as the details view reads it
+        queries = self.capture(lambda: list(reading_time_totals(self.students[:1], course_subjects(self.course), date(2022, 6, 5), date(2022, 6, 12))))
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET enable_seqscan = off')
+                cursor.execute('EXPLAIN ' + queries[-1]['sql'])
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+                cursor.execute('RESET enable_seqscan')
+                self.assertRegex(plan, r'Index Cond: .*start >= .*start < ')
+            else:
+                cursor.execute('EXPLAIN QUERY PLAN ' + queries[-1]['sql'])
+                plan = '\n'.join(row[-1] for row in cursor.fetchall())
+                self.assertRegex(plan, r'SEARCH ctkirep_readingtime .*start>\? AND start<\?')
+
+    def test_windowed_progress_test_export_plan(self):
+        queries = self.capture(lambda: b''.join(self.client.post(reverse('progress_test_export'), {
+            'course': self.course.id, 'start_date': '2022-05-05', 'end_date': '2022-05-06'}).streaming_content))
+        self.assertIndexed(queries)
+
+    def report_file(self, name, rows, header=None):
+        path = os.path.join(tempfile.mkdtemp(), name)
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            if header is None:
+                f.write(rows)
+            else:
+                writer = csv.writer(f)
+                writer.writerow(header)
+                writer.writerows(rows)
+        return path
+
+    def test_import_plans(self):
+        student = self.students[0]
+        results = list()
+        xml = '<report><tracking>{0}</tracking></report>'.format(''.join(
+            '<result><identifier>{0}</identifier><activity>ATPL book {1}</activity><starttime>{2:02}/07/2022 10:00:00</starttime>'
+            '<endtime>{2:02}/07/2022 10:30:00</endtime></result>'.format(student.reading_username, n % 3, n + 1) for n in range(5)))
+        queries = self.capture(lambda: results.append(bulk_reading_time(self.report_file('rt.xml', xml))))
+
+        status = [[student.pt_username, 'A', 'B', '', '2022-07-01T10:00:00.000Z', '', '', '', '', 'ATPL PT 0.{0}'.format(n), 'Test', 'passed', '95', '', '']
+                  for n in range(4)]
+        queries += self.capture(lambda: results.append(ace_contentstatus(self.report_file('ContentStatus.csv', status, [
+            'Username', 'First name', 'Surname', 'Groups', 'Timestamp', 'Date', 'Time', 'Activity ID', 'Activity external reference',
+            'Activity name', 'Display type', 'Status', 'Score', 'CPD points', 'Learning hours']))))
+
+        journey = [[student.pt_username, 'A', 'B', '', '2022-07-01T10:0{0}:00.000Z'.format(n), '', '', '5', 'PT1M', 'plan-{0}'.format(n), '',
+                    'ATPL PT 1.{0}'.format(n), '', '', 'Test', 'passed', '', '', '90'] for n in range(4)]
+        queries += self.capture(lambda: results.append(ace_journeyreport(self.report_file('LearnerJourney.csv', journey, [
+            'Username', 'First name', 'Surname', 'Groups', 'Timestamp', 'Date', 'Time', 'Attempt', 'Duration', 'Statement ID', 'Course ID',
+            'Course', 'Activity ID', 'Activity name', 'Type', 'Action', 'Response', 'Mark', 'Score']))))
+
+        self.assertEqual([result[:2] for result in results], ['OK'] * 3)
+        self.assertIndexed(queries)
+
+    @skipUnless(connection.vendor == 'postgresql', 'The staged merges run on PostgreSQL only')
+    def test_journey_merge_plans(self):
+        # The whole history without Statement IDs, as right after they were added, re-uploaded with them
+        ACELearnerJourney.objects.update(statement_id=None)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE ctkirep_acelearnerjourney')
+        student = self.students[0]
+        journey = [[student.pt_username, 'A', 'B', '', '2022-05-01T00:0{0}:00.000Z'.format(n), '', '', str(n + 1), 'PT1M', 'merge-{0}-{1}'.format(k, n), '',
+                    'ATPL PT 0.{0}'.format(k), '', '', 'Test', 'passed', '', '', '90'] for k in range(2) for n in range(5)]
+        results = list()
+        queries = self.capture(lambda: results.append(ace_journeyreport(self.report_file('LearnerJourney.csv', journey, [
+            'Username', 'First name', 'Surname', 'Groups', 'Timestamp', 'Date', 'Time', 'Attempt', 'Duration', 'Statement ID', 'Course ID',
+            'Course', 'Activity ID', 'Activity name', 'Type', 'Action', 'Response', 'Mark', 'Score']))))
+        self.assertTrue(results[0].startswith('OK, 2 records created, 8 existing records'), results[0])
+        merges = [query for query in queries if 'journey_stage' in query['sql'] and re.match(r'\s*(INSERT|UPDATE)\b', query['sql'])]
+        self.assertEqual(len(merges), 3)
+        self.assertEqual(self.full_scans(merges, lookups=True), [])
@@ -7,14 +7,26 @@ urlpatterns = [
     path("reading/", views.ReadingHomeView.as_view(), name="reading_time_home"),
     path("readingupload/", views.reading_time_upload, name="reading_time_upload"),
     path("readingreport/<int:course>", views.ReadingTimeView.as_view(), name="reading_time_report"),
+    path("readingreport/<int:course>/student/<int:id>", views.reading_time_student, name="reading_time_student"),
     path("readingexport/", views.reading_time_export, name="reading_time_export"),
+    path("exportall/", views.export_all_courses, name="export_all_courses"),
     path("progress/", views.PTBaseView.as_view(), name="progress_tests_home"),
     path("progressupload/<int:rtype>", views.content_status_upload, name="pt_upload_status"),
     path("progressupload/<int:rtype>", views.content_status_upload, name="pt_upload_journey"),
+    path("importjob/<int:jobid>", views.import_job_status, name="import_job_status"),
+    path("progressexport/", views.progress_test_export, name="progress_test_export"),
     path("progressexport/<int:courseid>", views.csv_export_pt, name="csv_export_pt"),
     path("students", views.StudentsHomeView.as_view(), name='students_home'),
     path("studentslist/<int:course>", views.StudentsTableView.as_view(), name='students_table'),
+    path("analytics/<int:course>", views.CohortAnalyticsView.as_view(), name='cohort_analytics'),
     path("progressreport/<int:course>", views.PTStatusReportView.as_view(), name="progress_tests_report"),
+    path("progressreport/<int:course>/student/<int:id>", views.progress_test_student, name="progress_test_student"),
+    path("api/v1/courses/<int:course>/readingtime", views.api_course_reading_time, name="api_course_reading_time"),
+    path("api/v1/courses/<int:course>/readingtime/<int:id>", views.api_student_reading_time, name="api_student_reading_time"),
+    path("api/v1/courses/<int:course>/progresstests", views.api_course_progress_tests, name="api_course_progress_tests"),
+    path("api/v1/courses/<int:course>/progresstests/<int:id>", views.api_student_progress_tests, name="api_student_progress_tests"),
+    path("api/v1/courses/<int:course>/sessions", views.api_course_events, {'kind': 'sessions'}, name="api_course_sessions"),
+    path("api/v1/courses/<int:course>/journey", views.api_course_events, {'kind': 'journey'}, name="api_course_journey"),
     path("accounts/login/", auth_views.LoginView.as_view(template_name='ctkirep/login.html'), name='login'),
     path("accounts/logout/", auth_views.LogoutView.as_view(), name='logout'),
     path("accounts/password_change/", auth_views.PasswordChangeView.as_view(template_name='ctkirep/change_password.html', success_url=reverse_lazy('home')), name='password_change'),
@@ -1,18 +1,23 @@
-import csv
-from datetime import timedelta, date
-from django.http import HttpResponse
+from datetime import date
+from urllib.parse import urlencode
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
 from django.urls import reverse, reverse_lazy
-from django.utils import timezone
+from django.conf import settings
+from django.utils import dateformat, timezone
 from django.shortcuts import get_object_or_404, render, get_list_or_404
 from django.views.generic import TemplateView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import condition, require_safe
 from django.contrib.auth.views import LoginView, PasswordChangeView
-from django.db.models import Sum, F, OuterRef, Subquery, Max, Count, Q, DateField, ExpressionWrapper
-
-from ctkirep.forms import UploadFileForm, PTFileForm, RTExportForm
-from ctkirep.utils import bulk_reading_time, ace_contentstatus, ace_journeyreport
-from ctkirep.models import ReadingTime, CourseType, Student, Course, ACEContentStatus, ACELearnerJourney
+from django.db import transaction
+from django.db.models import F, DateField, ExpressionWrapper
+
+from ctkirep.forms import UploadFileForm, PTFileForm, RTExportForm, DateRangeForm, EventExportForm
+from ctkirep.models import CourseType, Student, ImportJob, ExportSnapshot
+from ctkirep.caching import cached_report, course_version
+from ctkirep.reports import PASS_SCORE, cohort_analytics, reading_time_data, reading_time_overview, progress_test_data, progress_test_overview
+from ctkirep.exports import RT_HEADER, PT_HEADER, csv_blocks, reading_time_filename, progress_test_filename, event_filename, reading_time_csv_rows, progress_test_csv_rows, all_courses_zip, current_snapshot, event_header, event_rows, event_csv_rows, ndjson_blocks
 from ctkirep.templatetags.ctkirep_extras import duration, diffduration
 
 # Login
@@ -24,6 +29,56 @@ class CTKIRepPassChangeView(PasswordChangeView):
     template_name = 'ctkirep/change_password.html'
     success_url = reverse_lazy('home')
 
+# Uploads
+# ========================================================================
+def queue_import(upl_file, kind, context):
+    # An identical file that was imported, or is still waiting for or in its import, is not parsed again
+    sha256 = upl_file.fingerprint()
+    jobs = [upload.job for upload in type(upl_file).objects.filter(sha256=sha256, job__kind=kind).select_related('job').order_by('job__created')]
+    pending = [job for job in jobs if job.status in (ImportJob.QUEUED, ImportJob.RUNNING)]
+    if pending:
+        context['job'] = pending[0]
+        return 'File already queued as import job #{0}'.format(pending[0].id)
+    done = [job for job in jobs if job.status == ImportJob.DONE]
+    if done:
+        return 'File already imported on {0} (import job #{1})'.format(done[0].finished.strftime('%d.%m.%Y %H:%M'), done[0].id)
+
+    # Workers only see the job once it points at the saved file
+    with transaction.atomic():
+        job = ImportJob.objects.create(kind=kind, sha256=sha256)
+        upl_file.job = job
+        upl_file.save()
+        job.path = upl_file.file.path
+        job.save(update_fields=['path'])
+    context['job'] = job
+    return 'Queued as import job #{0}'.format(job.id)
+
+# Lazy report tables
+# ========================================================================
+def lazy_mode(request):
+    # ?lazy=1 / ?lazy=0 force the mode, otherwise it follows the cohort size
+    mode = request.GET.get('lazy')
+    return mode if mode in ('0', '1') else 'auto'
+
+def lazy_tables(request, students):
+    mode = lazy_mode(request)
+    if mode == 'auto':
+        return len(students) > settings.REPORT_LAZY_STUDENTS
+    return mode == '1'
+
+def range_query(start_date, end_date):
+    # Query string carrying the report date range over to the per-student requests
+    params = {name: value.isoformat() for name, value in (('start_date', start_date), ('end_date', end_date)) if value}
+    return '?' + urlencode(params) if params else ''
+
+def report_date(value):
+    return dateformat.format(value, 'd.m.Y H:s') if value else ''
+
+def score_label(score):
+    if score is None:
+        return None
+    return 'oklabel' if score >= PASS_SCORE else 'notoklabel'
+
 # Reading time
 # ========================================================================
 class HomeView(LoginRequiredMixin, TemplateView):
@@ -44,41 +99,57 @@ class ReadingTimeView(LoginRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        students = Student.objects.filter(course=self.kwargs['course'], active=True)
-        context['students'] = students
-        data = dict()
-        for student in students:
-            rt = ReadingTime.objects.values('student_id', 'activity_id').annotate(totaltime=Sum('duration'), last_time=Max('end'), alert=Count(
-                'duration', filter=Q(duration=timedelta(minutes=90)))).filter(student_id=student.id, activity_id=OuterRef('ractivity_id'))
-            st_data = Course.objects.filter(type=self.kwargs['course']).values('subject_order', 'subject__id', 'subject__code', 'subject__fname', 'ractivity__name', 'reqtime', 'ractivity_id').annotate(
-                totaltime=Subquery(rt.values('totaltime')), last_time=Subquery(rt.values('last_time')), diff=F('totaltime')-F('reqtime'), alert=Subquery(rt.values('alert'))).order_by('subject_order')
-            data[student.id] = st_data
-        context['data'] = data
+        form = DateRangeForm(self.request.GET)
+        self.start_date, self.end_date = form.range()
+        context.update(cached_report('readingtime', self.kwargs['course'], self.report_data, lazy_mode(self.request), self.start_date, self.end_date))
+        context['range_form'] = form
+        context['range_query'] = range_query(self.start_date, self.end_date)
         context['coursetypes'] = CourseType.objects.order_by('sorder')
-        context['subject_name'] = CourseType.objects.get(
-            pk=self.kwargs['course']).name
         return context
 
+    def report_data(self):
+        students = list(Student.objects.filter(course=self.kwargs['course'], active=True))
+        report = {'students': students, 'lazy': lazy_tables(self.request, students),
+                  'subject_name': CourseType.objects.get(pk=self.kwargs['course']).name}
+        if report['lazy']:
+            report['overview'] = reading_time_overview(self.kwargs['course'], students, self.start_date, self.end_date)
+        else:
+            report['data'] = reading_time_data(self.kwargs['course'], students, self.start_date, self.end_date)
+        return report
+
+@login_required
+def reading_time_student(request, course, id):
+    student = get_object_or_404(Student, id=id, course=course)
+    start_date, end_date = DateRangeForm(request.GET).range()
+    rows = cached_report('readingtime-student', course, lambda: reading_time_rows(course, student, start_date, end_date), id, start_date, end_date)
+    return JsonResponse({'student': student.id, 'rows': rows})
+
+def reading_time_rows(course, student, start_date=None, end_date=None):
+    # Cells are preformatted as in the full report; {'v': value, 'c': css class} marks highlighted cells
+    rows = list()
+    for st in reading_time_data(course, [student], start_date, end_date)[student.id]:
+        label = None
+        if st['diff'] is not None and st['diff'].total_seconds() != 0:
+            label = 'oklabel' if st['diff'].total_seconds() > 0 else 'notoklabel'
+        rows.append([st['subject_order'], st['subject__code'], st['subject__fname'], st['ractivity__name'], duration(st['reqtime']), duration(st['totaltime']),
+                     {'v': diffduration(st['diff']), 'c': label}, report_date(st['last_time']), st['alert']])
+    return rows
+
 class ReadingTimeDetailsView(LoginRequiredMixin, TemplateView):
     template_name = "ctkirep/reading_time_details.html"
     students = Student.objects.none()
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        students = get_list_or_404(Student, id=self.kwargs['id'])
-        data = dict()
-        for student in students:
-            rt = ReadingTime.objects.values('student_id', 'activity_id').annotate(totaltime=Sum(
-                'duration')).filter(student_id=student.id, activity_id=OuterRef('ractivity_id'))
-            st_data = Course.objects.filter(type=self.kwargs['course']).values('subject_order', 'subject__id', 'subject__code', 'subject__fname', 'ractivity__name', 'reqtime', 'ractivity_id').annotate(
-                totaltime=Subquery(rt.values('totaltime'))).annotate(diff=F('totaltime')-F('reqtime')).order_by('subject_order')
-            data[student.id] = st_data
-        context['data'] = data
+        context.update(cached_report('readingtimedetails', self.kwargs['course'], self.report_data, self.kwargs['id']))
         context['coursetypes'] = CourseType.objects.order_by('sorder')
-        context['subject_name'] = CourseType.objects.get(
-            pk=self.kwargs['course']).name
         return context
 
+    def report_data(self):
+        students = get_list_or_404(Student, id=self.kwargs['id'])
+        return {'data': reading_time_data(self.kwargs['course'], students),
+                'subject_name': CourseType.objects.get(pk=self.kwargs['course']).name}
+
 @login_required
 def reading_time_upload(request):
     res = ''
@@ -88,8 +159,7 @@ def reading_time_upload(request):
         form = UploadFileForm(request.POST, request.FILES)
         if form.is_valid():
             upl_file = form.save(commit=False)
-            upl_file.save()
-            res = bulk_reading_time(upl_file.file.path)
+            res = queue_import(upl_file, ImportJob.READING_TIME, context)
 
     form = UploadFileForm(initial={
                           'upload_status': res, 'timestamp': timezone.now().strftime("%Y-%m-%d %H:%M:%S")})
@@ -130,19 +200,34 @@ class PTStatusReportView(PTBaseView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        students = students = Student.objects.filter(course=self.kwargs['course'], active=True)
-        data = dict()
-        maxatt_q = ACELearnerJourney.objects.values('student', 'activity').annotate(Max(
-            'attempt')).filter(student_id=OuterRef('student_id'), activity_id=OuterRef('activity_id'))
-        for student in students:
-            data[student.id] = ACEContentStatus.objects.filter(activity__subject__course__type=self.kwargs['course'], student_id=student.id).values('activity__subject__course__subject_order', 'activity__subject__code', 'activity__subject__fname', 'student__id', 'activity__name', 'status__name', 'timestamp', 'score').annotate(max_attempt=Subquery(maxatt_q.values('attempt__max'))).order_by('student_id', 'activity__subject__course__subject_order', 'activity__ord')
-        context['data'] = data
-        context['students'] = students
+        context.update(cached_report('progresstests', self.kwargs['course'], self.report_data, lazy_mode(self.request)))
         context['coursetypes'] = CourseType.objects.order_by('sorder')
-        context['subject_name'] = CourseType.objects.get(
-            pk=self.kwargs['course']).name
         return context
 
+    def report_data(self):
+        students = list(Student.objects.filter(course=self.kwargs['course'], active=True))
+        report = {'students': students, 'lazy': lazy_tables(self.request, students),
+                  'subject_name': CourseType.objects.get(pk=self.kwargs['course']).name}
+        if report['lazy']:
+            report['overview'] = progress_test_overview(self.kwargs['course'], students)
+        else:
+            report['data'] = progress_test_data(self.kwargs['course'], students)
+        return report
+
+@login_required
+def progress_test_student(request, course, id):
+    student = get_object_or_404(Student, id=id, course=course)
+    rows = cached_report('progresstests-student', course, lambda: progress_test_rows(course, student), id)
+    return JsonResponse({'student': student.id, 'rows': rows})
+
+def progress_test_rows(course, student):
+    rows = list()
+    for st in progress_test_data(course, [student])[student.id]:
+        label = score_label(st['score'])
+        rows.append([st['activity__subject__course__subject_order'], st['activity__subject__code'], st['activity__subject__fname'], st['activity__name'],
+                     {'v': st['status__name'].upper(), 'c': label}, report_date(st['timestamp']), {'v': st['score'], 'c': label}, st['max_attempt']])
+    return rows
+
 @login_required
 def content_status_upload(request, rtype):
     res = ''
@@ -152,11 +237,10 @@ def content_status_upload(request, rtype):
         form = PTFileForm(request.POST, request.FILES)
         if form.is_valid():
             upl_file = form.save(commit=False)
-            upl_file.save()
             if rtype == 1:
-                res = ace_contentstatus(upl_file.file.path)
+                res = queue_import(upl_file, ImportJob.CONTENT_STATUS, context)
             else:
-                res = ace_journeyreport(upl_file.file.path)
+                res = queue_import(upl_file, ImportJob.JOURNEY, context)
 
     form = PTFileForm(initial={
                       'upload_status': res, 'timestamp': timezone.now().strftime("%Y-%m-%d %H:%M:%S")})
@@ -168,6 +252,23 @@ def content_status_upload(request, rtype):
 
     return render(request, 'ctkirep/progress_tests_upload.html', context)
 
+@login_required
+def import_job_status(request, jobid):
+    job = get_object_or_404(ImportJob, id=jobid)
+    return JsonResponse({
+        'id': job.id,
+        'kind': job.get_kind_display(),
+        'status': job.status,
+        'phase': job.phase,
+        'rows': job.rows,
+        'message': job.message,
+        'created': job.created,
+        'started': job.started,
+        'finished': job.finished,
+        'attempts': job.attempts,
+        'stalled': job.stalled(),
+    })
+
 @login_required
 def progress_test_export(request):
     course_types = CourseType.objects.values('id', 'name').order_by('sorder')
@@ -179,12 +280,13 @@ def progress_test_export(request):
     if request.method == 'POST':
         form = RTExportForm(course_choices, request.POST)
         if form.is_valid():
-            return csv_export_pt(request, form.cleaned_data['course'], course_types.get(id=form.cleaned_data['course'])['name'], form.cleaned_data['start_date'], form.cleaned_data['end_date'])
+            return csv_export_pt(request, form.cleaned_data['course'], form.cleaned_data['start_date'], form.cleaned_data['end_date'])
     else:
         form = RTExportForm(course_choices)
 
     context['form'] = form
-    return render(request, 'ctkirep/reading_time_export.html', context)
+    return render(request, 'ctkirep/progress_test_export.html', context)
+
 # Students
 # ========================================================================
 class StudentsHomeView(LoginRequiredMixin, TemplateView):
@@ -202,58 +304,146 @@ class StudentsTableView(LoginRequiredMixin, TemplateView):
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-
-        students = Student.objects.filter(course=self.kwargs['course']).annotate(
-            sub_end=ExpressionWrapper(F('start_date') + 18*30, output_field=DateField()))
+        context.update(cached_report('students', self.kwargs['course'], self.report_data))
         course_types = CourseType.objects.order_by('sorder')
         context['coursetypes'] = course_types
-        context['students'] = students
-        context['subject_name'] = CourseType.objects.get(
-            pk=self.kwargs['course']).name
         return context
 
+    def report_data(self):
+        students = list(Student.objects.filter(course=self.kwargs['course']).annotate(
+            sub_end=ExpressionWrapper(F('start_date') + 18*30, output_field=DateField())))
+        return {'students': students, 'subject_name': CourseType.objects.get(pk=self.kwargs['course']).name}
+
+class CohortAnalyticsView(StudentsHomeView):
+    template_name = "ctkirep/cohort_analytics.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(cached_report('analytics', self.kwargs['course'], self.report_data))
+        return context
+
+    def report_data(self):
+        return {'rows': cohort_analytics(self.kwargs['course']), 'subject_name': get_object_or_404(CourseType, pk=self.kwargs['course']).name}
+
 # CSV export views
 # ========================================================================
+def csv_stream(filename, header, rows):
+    return StreamingHttpResponse(csv_blocks(header, rows), content_type='text/csv',
+                                 headers={'Content-Disposition': 'attachment; filename="{0}"'.format(filename)})
+
+def snapshot_response(snapshot, filename):
+    return FileResponse(snapshot.file.open('rb'), as_attachment=True, filename=filename, content_type='text/csv')
+
 @login_required
 def csv_export_rt(request, courseid, course_name, start_date, end_date):
-    # Create the HttpResponse object with the appropriate CSV header.
-    response = HttpResponse(
-        content_type='text/csv',
-        headers={'Content-Disposition': 'attachment; filename="ReadingTime_{0}_{1}_{2}.csv"'.format(course_name, start_date, end_date)},
-    )
-
-    writer = csv.writer(response)
-    writer.writerow(['Name', 'Surname', 'Code', 'Subject', 'Activity', 'Required time', 'Reading time', 'Difference', 'Last read time', 'Max timer'])
-    students = get_list_or_404(Student, course=courseid)
-    for student in students:
-        rt = ReadingTime.objects.values('student_id', 'activity_id').annotate(totaltime=Sum('duration'), last_time=Max('end'), alert=Count(
-            'duration', filter=Q(duration=timedelta(minutes=90)))).filter(student_id=student.id, start__gte=start_date, end__lte=end_date, activity_id=OuterRef('ractivity_id'))
-        st_data = Course.objects.filter(type=courseid).values('subject_order', 'subject__id', 'subject__code', 'subject__fname', 'ractivity__name', 'reqtime', 'ractivity_id').annotate(
-            totaltime=Subquery(rt.values('totaltime')), last_time=Subquery(rt.values('last_time')), diff=F('totaltime')-F('reqtime'), alert=Subquery(rt.values('alert'))).order_by('subject_order')
-        
-        for cst_data in st_data:
-            writer.writerow([student.name, student.surname, cst_data['subject__code'], cst_data['subject__fname'], cst_data['ractivity__name'], duration(cst_data['reqtime']), duration(cst_data['totaltime']), diffduration(cst_data['diff']), cst_data['last_time'], cst_data['alert']])
-
-    return response
+    if not Student.objects.filter(course=courseid).exists():
+        raise Http404('No students in this course')
+    filename = reading_time_filename(course_name, start_date, end_date)
+    snapshot = current_snapshot(ExportSnapshot.READING_TIME, courseid, start_date, end_date)
+    if snapshot is not None:
+        return snapshot_response(snapshot, filename)
+    return csv_stream(filename, RT_HEADER, reading_time_csv_rows(courseid, start_date, end_date))
 
 @login_required
-def csv_export_pt(request, courseid):
-    # Create the HttpResponse object with the appropriate CSV header.
+def csv_export_pt(request, courseid, start_date=None, end_date=None):
     course = get_object_or_404(CourseType, id=courseid)
-    response = HttpResponse(
-        content_type='text/csv',
-        headers={'Content-Disposition': 'attachment; filename="ProgressTests_{0}_{1}.csv"'.format(course.name, date.today())},
-    )
-
-    writer = csv.writer(response)
-    writer.writerow(['Name', 'Surname', 'Code', 'Subject', 'Test', 'Status', 'Timestamp', 'Score', 'Attempts'])
-    
-    students = get_list_or_404(Student, course=courseid)
-    data = dict()
-    maxatt_q = ACELearnerJourney.objects.values('student', 'activity').annotate(Max('attempt')).filter(student_id=OuterRef('student_id'), activity_id=OuterRef('activity_id'))
-    for student in students:
-        data = ACEContentStatus.objects.filter(activity__subject__course__type=courseid, student_id=student.id).values('activity__subject__course__subject_order', 'activity__subject__code', 'activity__subject__fname', 'student__id', 'activity__name', 'status__name', 'timestamp', 'score').annotate(max_attempt=Subquery(maxatt_q.values('attempt__max'))).order_by('student_id', 'activity__subject__course__subject_order', 'activity__ord')
-        for row in data:
-            writer.writerow([student.name, student.surname, row['activity__subject__code'], row['activity__subject__fname'], row['activity__name'], row['status__name'].upper(), row['timestamp'], row['score'], row['max_attempt']])
-
-    return response
+    if not Student.objects.filter(course=courseid).exists():
+        raise Http404('No students in this course')
+    filename = progress_test_filename(course.name, start_date, end_date)
+    snapshot = current_snapshot(ExportSnapshot.PROGRESS_TESTS, courseid, start_date, end_date)
+    if snapshot is not None:
+        return snapshot_response(snapshot, filename)
+    return csv_stream(filename, PT_HEADER, progress_test_csv_rows(courseid, start_date, end_date))
+
+@login_required
+@require_safe
+def api_course_events(request, course, kind):
+    # Raw reading sessions or learner journey events, streamed as CSV or NDJSON
+    course_type = get_object_or_404(CourseType, id=course)
+    form = EventExportForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    start_date, end_date = form.range()
+    student = form.cleaned_data['student']
+    if student is not None:
+        get_object_or_404(Student, id=student, course=course)
+    rows = event_rows(kind, course, student, start_date, end_date)
+    filename = event_filename(kind, course_type.name, start_date, end_date)
+    if form.cleaned_data['format'] == 'ndjson':
+        return StreamingHttpResponse(ndjson_blocks(rows), content_type='application/x-ndjson',
+                                     headers={'Content-Disposition': 'attachment; filename="{0}.ndjson"'.format(filename)})
+    return csv_stream(filename + '.csv', event_header(kind), event_csv_rows(kind, rows))
+
+@login_required
+def export_all_courses(request):
+    return StreamingHttpResponse(all_courses_zip(settings.EXPORT_DEADLINE, settings.EXPORT_WORKERS), content_type='application/zip',
+                                 headers={'Content-Disposition': 'attachment; filename="Reports_{0}.zip"'.format(date.today())})
+
+# JSON API
+# ========================================================================
+# Same data as the report pages; ETag and Last-Modified follow the course data version
+def api_etag(request, course, **kwargs):
+    return 'v1-{0}-{1}'.format(course, course_version(request, course)[0])
+
+def api_last_modified(request, course, **kwargs):
+    # Stored as naive local time (USE_TZ is off), the header is built from an aware value
+    updated = course_version(request, course)[1]
+    if updated is not None and timezone.is_naive(updated):
+        updated = timezone.make_aware(updated, timezone.get_default_timezone())
+    return updated
+
+api_conditional = condition(etag_func=api_etag, last_modified_func=api_last_modified)
+
+def api_student(student, rows):
+    return {'id': student.id, 'name': student.name, 'surname': student.surname, 'active': student.active, 'rows': rows}
+
+def api_reading_time(course, students, start_date=None, end_date=None):
+    data = reading_time_data(course, students, start_date, end_date)
+    return {'course': course, 'start_date': start_date, 'end_date': end_date, 'students': [api_student(student, [{
+        'order': st['subject_order'], 'code': st['subject__code'], 'subject': st['subject__fname'], 'activity': st['ractivity__name'],
+        'required': st['reqtime'], 'total': st['totaltime'], 'difference': st['diff'], 'last_read': st['last_time'], 'max_timer': st['alert'],
+    } for st in data[student.id]]) for student in students]}
+
+def api_progress_tests(course, students):
+    data = progress_test_data(course, students)
+    return {'course': course, 'students': [api_student(student, [{
+        'order': st['activity__subject__course__subject_order'], 'code': st['activity__subject__code'], 'subject': st['activity__subject__fname'],
+        'test': st['activity__name'], 'status': st['status__name'], 'timestamp': st['timestamp'], 'score': st['score'], 'attempts': st['max_attempt'],
+    } for st in data[student.id]]) for student in students]}
+
+@login_required
+@require_safe
+@api_conditional
+def api_course_reading_time(request, course):
+    get_object_or_404(CourseType, id=course)
+    form = DateRangeForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    start_date, end_date = form.range()
+    return JsonResponse(cached_report('api-readingtime', course, lambda: api_reading_time(
+        course, list(Student.objects.filter(course=course, active=True)), start_date, end_date), start_date, end_date))
+
+@login_required
+@require_safe
+@api_conditional
+def api_student_reading_time(request, course, id):
+    student = get_object_or_404(Student, id=id, course=course)
+    form = DateRangeForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse({'errors': form.errors}, status=400)
+    start_date, end_date = form.range()
+    return JsonResponse(cached_report('api-readingtime-student', course, lambda: api_reading_time(course, [student], start_date, end_date), id, start_date, end_date))
+
+@login_required
+@require_safe
+@api_conditional
+def api_course_progress_tests(request, course):
+    get_object_or_404(CourseType, id=course)
+    return JsonResponse(cached_report('api-progresstests', course, lambda: api_progress_tests(course, list(Student.objects.filter(course=course, active=True)))))
+
+@login_required
+@require_safe
+@api_conditional
+def api_student_progress_tests(request, course, id):
+    student = get_object_or_404(Student, id=id, course=course)
+    return JsonResponse(cached_report('api-progresstests-student', course, lambda: api_progress_tests(course, [student]), id))